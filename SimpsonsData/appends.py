@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+# Incremental reading of data asset files which only ever have rows added to the end (detail "append_only"), so that a change costs
+# in proportion to the new rows rather than the whole file. After each read, the state records how far into the file has been read
+# (always to the end of a line), where the header line ends and hashes of the first and last blocks read. On the next change to the
+# file, if those blocks are the same and the file has not shrunk, only the bytes after the offset are parsed, with the header line
+# put in front; anything else counts as a rewrite and the whole file is read again. Edits to rows between the first and last blocks
+# are not detected: "append_only" is a promise that these do not happen.
+# The state is a dict of JSON-compatible values so that it can be kept in the manifest of the shared store (SimpsonsData.shared_store).
+BLOCK = 64 * 1024
+
+
+class _Range(io.RawIOBase):
+    """File-like reader of prefix followed by bytes start to end of the file at path, for pandas.read_csv."""
+    def __init__(self, path, start, end, prefix=b""):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._prefix = prefix
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._file.read(min(len(buffer), self._remaining))
+        self._remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _hash(f, start, end):
+    f.seek(start)
+    return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+def _state(f, stat, offset, header_end):
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "offset": offset, "header_end": header_end,
+            "head": _hash(f, 0, min(offset, max(BLOCK, header_end))), "tail": _hash(f, max(0, offset - BLOCK), offset)}
+
+
+def unchanged(path, state) -> bool:
+    stat = os.stat(path)
+    return state is not None and (stat.st_mtime_ns, stat.st_size) == (state["mtime_ns"], state["size"])
+
+
+def read_all(path, read):
+    """read(file-like) of the whole file, with the state for read_appended(). Returns (result, state)."""
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        header_end = len(f.readline())
+        state = _state(f, stat, stat.st_size, header_end)
+    with io.BufferedReader(_Range(path, 0, stat.st_size)) as source:
+        return read(source), state
+
+
+def read_appended(path, state, read):
+    """read(file-like) of the header and the complete lines added since state, with the new state. Returns (None, state) if there
+    are no new complete lines, or (None, None) if the file has been changed other than by adding lines (read it all again)."""
+    stat = os.stat(path)
+    offset = state["offset"]
+    if stat.st_size < offset:
+        return None, None
+    with open(path, "rb") as f:
+        head = _hash(f, 0, min(offset, max(BLOCK, state["header_end"])))
+        if head != state["head"] or _hash(f, max(0, offset - BLOCK), offset) != state["tail"]:
+            return None, None
+        if 0 < offset < stat.st_size:
+            f.seek(offset - 1)
+            if b"\n" not in f.read(2):
+                return None, None  # the last line read has been continued
+        # up to the end of the last complete line; a partly-written line is left for next time
+        end = stat.st_size
+        while end > offset:
+            start = max(offset, end - BLOCK)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end == offset:
+            return None, {**state, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        f.seek(0)
+        header = f.read(state["header_end"])
+        new_state = _state(f, stat, end, state["header_end"])
+    with io.BufferedReader(_Range(path, offset, end, prefix=header)) as source:
+        return read(source), new_state
+
+
+def fold_tally(tally: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Add the counts of a tally of new rows to an existing tally (both as made by SimpsonsData.tally), in the same order."""
+    cols = [c for c in tally.columns if c != "N"]
+    counts = tally.set_index(cols).N.astype("int64").add(delta.set_index(cols).N, fill_value=0)
+    return counts.astype("int64").rename("N").sort_index().reset_index()
+
+
+def collapse_tally(tally: pd.DataFrame) -> pd.DataFrame:
+    """A tally with one row for each distinct combination of category values, their counts summed, in order of first appearance.
+    A frame without an "N" column is returned as it is."""
+    if "N" not in tally.columns:
+        return tally
+    cols = [c for c in tally.columns if c != "N"]
+    return tally.groupby(cols, sort=False, observed=True, dropna=False).N.sum().reset_index()[list(tally.columns)]
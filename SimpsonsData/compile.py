@@ -0,0 +1,55 @@
+"""Compile the data asset of each specification to a typed, memory-mappable file (see SimpsonsData.compiled).
+Run from the repository root: python -m SimpsonsData.compile [--out DIR] [specification_id ...]
+Without specification ids, all specifications (including disabled ones) are compiled.
+Row-level assets are tallied, so loading the compiled asset skips the row-level file.
+"""
+import argparse
+import sys
+
+from simpsons import core, specification_items
+from SimpsonsData import compiled
+from SimpsonsData.datasets import frame_fingerprint, read_asset, spec_fingerprint
+
+
+def compile_specification(specification_id, spec, directory):
+    data = compiled.typed_frame(read_asset(spec, "data"), spec.detail)
+    meta = {
+        "specification_id": specification_id,
+        "asset_key": "data",
+        "spec_version": spec_fingerprint(spec),
+        "content_hash": frame_fingerprint(data),
+        "rows": len(data),
+        "dtypes": {col: str(dtype) for col, dtype in data.dtypes.items()}
+    }
+    compiled.write_compiled(data, meta, specification_id, directory=directory)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("specification_ids", nargs="*")
+    parser.add_argument("--out", default=compiled.COMPILED_DIR, help="output directory (default: SIMPSONS_COMPILED_DIR)")
+    args = parser.parse_args()
+    if compiled.pa is None:
+        sys.exit("pyarrow is required to compile assets")
+    if args.out == "":
+        sys.exit("give an output directory with --out or SIMPSONS_COMPILED_DIR")
+
+    specifications = specification_items(core.get_specifications(include_disabled=True))
+    if args.specification_ids:
+        specifications = [(sid, spec) for sid, spec in specifications if sid in args.specification_ids]
+    failed = 0
+    for specification_id, spec in specifications:
+        if "data" not in spec.asset_map:
+            continue
+        try:
+            meta = compile_specification(specification_id, spec, args.out)
+            print(f"{specification_id}: {meta['rows']} rows, content {meta['content_hash']}")
+        except Exception as ex:
+            failed += 1
+            print(f"{specification_id}: FAILED {ex!r}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # optional: without pyarrow, assets are always read from CSV
+    pa = None
+
+# Compiled data assets: the "data" asset of a specification, typed (categorical dtype for category columns, numeric N and continuous
+# columns) and written as an uncompressed Arrow IPC (Feather v2) file, which can be memory-mapped. A small JSON file alongside records
+# the fingerprint of the specification it was compiled from and a hash of the content, which serves as the data version without
+# having to hash the frame on load. Files are written by "python -m SimpsonsData.compile" and read by SimpsonsData.datasets.
+# A compiled file is ignored if the specification has changed since it was compiled, but NOT if the source CSV has changed: re-compile
+# after changing the data.
+COMPILED_DIR = os.environ.get("SIMPSONS_COMPILED_DIR", "")
+
+
+def available(directory=None):
+    return pa is not None and (directory or COMPILED_DIR) != ""
+
+
+def compiled_paths(specification_id: str, asset_key="data", directory=None):
+    stub = os.path.join(directory or COMPILED_DIR, f"{specification_id}.{asset_key}")
+    return f"{stub}.arrow", f"{stub}.json"
+
+
+def typed_frame(data: pd.DataFrame, detail: dict) -> pd.DataFrame:
+    """A copy of an asset dataframe with N as integer, continuous columns as float and all other columns categorical (with
+    categories in sorted order, so that sorting and grouping give the same order as for strings)."""
+    numeric = set(detail.get("continuous_cols", []))
+    typed = {}
+    for col in data.columns:
+        if col == "N":
+            typed[col] = data[col].astype("int64")
+        elif col in numeric:
+            typed[col] = data[col].astype("float64")
+        else:
+            typed[col] = data[col].astype("category")
+    return pd.DataFrame(typed)
+
+
+def write_compiled(data: pd.DataFrame, meta: dict, specification_id: str, asset_key="data", directory=None):
+    """Write a typed frame and its metadata. Both are written to temporary files first so that a running loader never sees a
+    partial file; the metadata is replaced last because the loader reads it first."""
+    data_path, meta_path = compiled_paths(specification_id, asset_key, directory)
+    os.makedirs(os.path.dirname(data_path) or ".", exist_ok=True)
+    feather.write_feather(data, f"{data_path}.tmp", compression="uncompressed")
+    os.replace(f"{data_path}.tmp", data_path)
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def read_meta(specification_id: str, spec_version: str, asset_key="data", directory=None):
+    """Metadata of the compiled asset, or None if there is none or it was compiled from a different version of the specification."""
+    if not available(directory):
+        return None
+    _, meta_path = compiled_paths(specification_id, asset_key, directory)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get("spec_version") != spec_version:
+        logging.warning(f"Compiled asset {meta_path} is out of date with the specification; reading the source asset instead")
+        return None
+    return meta
+
+
+def read_compiled(specification_id: str, asset_key="data", directory=None) -> pd.DataFrame:
+    data_path, _ = compiled_paths(specification_id, asset_key, directory)
+    # memory-mapping avoids reading the file into a buffer before conversion; dictionary-encoded columns become categoricals
+    return feather.read_table(data_path, memory_map=True).to_pandas(split_blocks=True)
@@ -0,0 +1,75 @@
+import threading
+
+import pandas as pd
+
+from SimpsonsData.datasets import load_data, frame_bytes
+from SimpsonsData.rates import outcome_rates
+from SimpsonsData.resident import resident_set
+
+# Pre-computed aggregates for the categorical views.
+# The cube holds the N-weighted outcome count and the total N for every compare x facet pairing of the categorical columns so that
+# a change of drop-down in the explore view is a dictionary lookup rather than a groupby pipeline over the source data.
+# Cubes count towards the in-process memory budget along with the data they are built from (see SimpsonsData.resident).
+
+_lock = threading.Lock()
+_cubes = {}  # specification_id -> CategoricalCube
+
+
+class CategoricalCube:
+    def __init__(self, data: pd.DataFrame, outcome_col: str, outcome_numerator: str, version=None):
+        self.outcome_col = outcome_col
+        self.outcome_numerator = outcome_numerator
+        self.version = version
+        # the columns which the user can choose to explore, in source order
+        self.columns = [c for c in data.columns if c not in ("N", outcome_col)]
+
+        # key is (compare, facet) where facet is None for the un-faceted case. Tables hold outcome_N, N and outcome_rate, indexed by category.
+        # a facetted pairing is computed once and re-ordered for its mirror image
+        self._tables = {}
+        for i, compare in enumerate(self.columns):
+            self._tables[(compare, None)] = outcome_rates(data, compare, outcome_col, outcome_numerator)
+            for facet in self.columns[i + 1:]:
+                table = outcome_rates(data, [compare, facet], outcome_col, outcome_numerator)
+                self._tables[(compare, facet)] = table
+                self._tables[(facet, compare)] = table.reorder_levels([facet, compare]).sort_index()
+        self.nbytes = sum(frame_bytes(table) for table in self._tables.values())
+
+    def lookup(self, compare: str, facet=None):
+        """Outcome rate (%) and Count for each combination of compare and (optionally) facet categories.
+        A facet of None or "none" gives the un-faceted case. Returns a new dataframe which the caller may modify."""
+        if facet == "none":
+            facet = None
+        table = self._tables[(compare, facet)]
+        return table[["outcome_rate", "N"]].rename(columns={"N": "Count"}).reset_index()
+
+    def to_client(self):
+        """Compact, JSON-ready form of the cube for rendering in the browser.
+        tables[compare][facet or "none"] is a list of rows: [compare value, (facet value), outcome_N, N]"""
+        tables = {}
+        for (compare, facet), table in self._tables.items():
+            rows = table[["outcome_N", "N"]].reset_index().values.tolist()
+            tables.setdefault(compare, {})["none" if facet is None else facet] = rows
+        return {"columns": self.columns, "tables": tables}
+
+
+def get_cube(specification_id: str, spec):
+    """The aggregate cube for a categorical specification, built on first use and rebuilt when the specification or its data changes."""
+    data, version = load_data(specification_id, spec)
+    with _lock:
+        cube = _cubes.get(specification_id)
+    if cube is not None and cube.version == version:
+        return cube
+
+    cube = CategoricalCube(data, spec.detail["outcome"], spec.detail["outcome_numerator"], version=version)
+    with _lock:
+        _cubes[specification_id] = cube
+    resident_set.account(specification_id, "cube", cube.nbytes)
+    return cube
+
+
+def _evict(specification_id: str):
+    with _lock:
+        _cubes.pop(specification_id, None)
+
+
+resident_set.register_evictor(_evict)
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from SimpsonsData import appends, compiled, shared_store, tally
+from SimpsonsData.resident import resident_set
+from SimpsonsData.settings import env_float
+
+# In-process cache of specification data assets, shared by all of the Dash views (and anything else running in the same process).
+# Each entry carries a version string which changes whenever the specification or the content of the asset changes; derived
+# structures (e.g. the aggregate cube) are keyed on this version so that they are rebuilt automatically.
+# The specification is fingerprinted on every call (cheap, and the caller already has it) but re-reading the asset itself to check
+# for changes only happens every REVALIDATE_SECONDS.
+# Where a compiled copy of the asset exists (see SimpsonsData.compiled) it is used instead, and revalidation only reads its metadata.
+# Row-level categorical assets (detail "row_level") are tallied on load (see SimpsonsData.tally); when streamed from a file, they are
+# only re-read if the file has changed. Files of "append_only" assets are read incrementally (see SimpsonsData.appends).
+# With SIMPSONS_SHARED_DIR set, the processes of a multi-worker server share one memory-mapped copy of each asset and its checks
+# against the source (see SimpsonsData.shared_store).
+# Loaded assets count towards the in-process memory budget (see SimpsonsData.resident) and are dropped when their specification is evicted.
+REVALIDATE_SECONDS = env_float("SIMPSONS_DATA_REVALIDATE", 60)
+
+_lock = threading.Lock()
+_loaded = {}  # (specification_id, asset_key) -> LoadedAsset
+_append_listeners = []
+
+
+class LoadedAsset:
+    def __init__(self, data, spec_version, data_version, source_stamp=None):
+        self.data = data
+        self.spec_version = spec_version
+        self.data_version = data_version
+        self.source_stamp = source_stamp
+        self.checked = time.monotonic()
+
+    @property
+    def version(self):
+        return f"{self.spec_version}-{self.data_version}"
+
+
+def spec_fingerprint(spec):
+    """Short hash of the parts of a specification which affect how its data is processed."""
+    content = json.dumps([spec.detail, spec.asset_map], sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+
+
+def frame_fingerprint(df: pd.DataFrame):
+    """Short hash of the content of a dataframe (column names and values, ignoring the index)."""
+    h = hashlib.sha1(json.dumps(list(df.columns), default=str).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()[:12]
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """Memory used by a dataframe, including the contents of string columns and the index."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def load_data(specification_id: str, spec, asset_key="data"):
+    """Return (dataframe, version) for a specification's data asset, loading it only when not already cached or when changed.
+    The dataframe is shared between callers and must be treated as read-only."""
+    key = (specification_id, asset_key)
+    spec_version = spec_fingerprint(spec)
+    with _lock:
+        loaded = _loaded.get(key)
+    if loaded is not None and loaded.spec_version == spec_version and time.monotonic() - loaded.checked < REVALIDATE_SECONDS:
+        resident_set.touch(specification_id)
+        return loaded.data, loaded.version
+    started = time.perf_counter()
+    if loaded is not None and loaded.spec_version != spec_version:
+        loaded = None
+
+    if not shared_store.enabled():
+        data, data_version, stamp, appended = _read_source(specification_id, spec, asset_key, spec_version, loaded)
+        result = _keep(key, loaded, spec_version, data, data_version, stamp, started)
+        _notify_appended(specification_id, asset_key, appended, result[1])
+        return result
+
+    # multi-process: use the copy in the shared store, if another process has checked it recently, or load and publish it
+    with shared_store.locked(specification_id, asset_key):
+        published = shared_store.lookup(specification_id, spec_version, REVALIDATE_SECONDS, asset_key)
+        appended = None
+        if published is None or not published.fresh:
+            # this process's copy, when it is the shared one, so that appended rows can be added to it
+            current = loaded if loaded is not None and (published is None or loaded.data_version == published.data_version) else published
+            data, data_version, stamp, appended = _read_source(specification_id, spec, asset_key, spec_version, current)
+            if data is None and published is None:
+                data = loaded.data  # unchanged from this process's copy, which has not been shared
+            try:
+                # data is None if unchanged from the shared copy, which is then only marked as checked
+                published = shared_store.publish(specification_id, spec_version, data_version, stamp,
+                                                  None if data is None else compiled.typed_frame(data, spec.detail), asset_key)
+            except Exception as ex:  # e.g. the store is full: carry on with a private copy
+                shared_store.report_failure(specification_id, asset_key, ex)
+                if data is None and (loaded is None or loaded.data_version != data_version):
+                    data, data_version, stamp, appended = _read_source(specification_id, spec, asset_key, spec_version, None)
+                result = _keep(key, loaded, spec_version, data, data_version, stamp, started)
+                _notify_appended(specification_id, asset_key, appended, result[1])
+                return result
+        if loaded is not None and loaded.data_version == published.data_version:
+            return _keep(key, loaded, spec_version, None, loaded.data_version, published.source_stamp, started)
+        data = shared_store.attach(published)
+    result = _keep(key, None, spec_version, data, published.data_version, published.source_stamp, started)
+    _notify_appended(specification_id, asset_key, appended, result[1])
+    return result
+
+
+def _read_source(specification_id: str, spec, asset_key, spec_version, current):
+    """(dataframe, data_version, source_stamp, appended) from the source of an asset (or its compiled copy). The dataframe is None if
+    the asset is known to be unchanged from current (anything with data_version and source_stamp) without reading it all.
+    appended is (current version, new rows) when the dataframe is current's with rows added (see _read_appended), otherwise None."""
+    stamp = None
+    meta = compiled.read_meta(specification_id, spec_version, asset_key)
+    if meta is not None:
+        data_version = meta["content_hash"]
+        if current is not None and current.data_version == data_version:
+            return None, data_version, stamp, None
+        data = compiled.read_compiled(specification_id, asset_key)
+    elif spec.detail.get("append_only", False) and tally.asset_source(spec, asset_key) is not None:
+        return _read_appended(spec, tally.asset_source(spec, asset_key), current)
+    elif spec.detail.get("row_level", False):
+        source = tally.asset_source(spec, asset_key)
+        stamp = tally.source_stamp(source)
+        if stamp is not None and current is not None and current.source_stamp == stamp:
+            return None, current.data_version, stamp, None
+        data = tally.tally_asset(spec, asset_key, source)
+        data_version = frame_fingerprint(data)
+    else:
+        data = spec.load_asset_dataframe(asset_key)
+        data_version = frame_fingerprint(data)
+    if current is not None and current.data_version == data_version:
+        return None, data_version, stamp, None
+    return data, data_version, stamp, None
+
+
+def _read_appended(spec, source, current):
+    """As _read_source, for an "append_only" asset file: only the lines added since current was read are parsed, and added to its
+    frame (or, if row-level, tallied and added to its tally). The source stamp is the state of SimpsonsData.appends.
+    A categorical tally is kept to one row per combination of categories, so that the cube and view model built from it cost in
+    proportion to the number of combinations, not the number of rows appended over time."""
+    row_level = spec.detail.get("row_level", False)
+    collapse = appends.collapse_tally if "continuous_cols" not in spec.detail else (lambda df: df)
+    columns = spec.detail.get("tally_columns", None)
+    state = None if current is None else current.source_stamp
+    if not isinstance(state, dict):
+        state = None
+    if state is not None and appends.unchanged(source, state):
+        return None, current.data_version, state, None
+
+    previous = getattr(current, "data", None)  # a Published (shared store) asset has no frame to add to
+    if state is not None and previous is not None:
+        if row_level:
+            read = lambda f: tally.tally_rows(f, columns)
+        else:
+            # new rows must parse to the same columns and types as the existing ones
+            dtypes = {c: str if isinstance(t, pd.CategoricalDtype) else t for c, t in previous.dtypes.items()}
+            read = lambda f: pd.read_csv(f, dtype=dtypes)
+        try:
+            delta, new_state = appends.read_appended(source, state, read)
+        except (ValueError, TypeError) as ex:
+            logging.warning(f"Could not add the new rows of {source} ({ex!r}); reading it all again")
+            delta, new_state = None, None
+        if new_state is not None and (delta is None or len(delta) == 0):
+            return None, current.data_version, new_state, None
+        if new_state is not None and (row_level or list(delta.columns) == list(previous.columns)):
+            if row_level:
+                data = appends.fold_tally(previous, delta)
+                return data, frame_fingerprint(data), new_state, None
+            data = collapse(pd.concat([previous, delta], ignore_index=True))
+            data_version = hashlib.sha1(f"{current.data_version}+{frame_fingerprint(delta)}".encode("utf-8")).hexdigest()[:12]
+            return data, data_version, new_state, (current.version, delta)
+
+    read = (lambda f: tally.tally_rows(f, columns)) if row_level else (lambda f: collapse(pd.read_csv(f)))
+    data, new_state = appends.read_all(source, read)
+    data_version = frame_fingerprint(data)
+    if current is not None and current.data_version == data_version:
+        return None, data_version, new_state, None
+    return data, data_version, new_state, None
+
+
+def register_append_listener(listener):
+    """listener(specification_id, asset_key, old_version, new_version, new_rows) is called after rows have been added to an
+    "append_only" asset (not row-level), so that aggregates of the old version can be carried forward rather than recomputed."""
+    _append_listeners.append(listener)
+
+
+def _notify_appended(specification_id, asset_key, appended, version):
+    if appended is None:
+        return
+    old_version, delta = appended
+    for listener in _append_listeners:
+        listener(specification_id, asset_key, old_version, version, delta)
+
+
+def _keep(key, loaded, spec_version, data, data_version, stamp, started):
+    if loaded is not None and loaded.data_version == data_version:
+        # unchanged: keep the existing frame so that anything keyed on it stays valid
+        loaded.checked = time.monotonic()
+        loaded.source_stamp = stamp
+        resident_set.touch(key[0])
+        return loaded.data, loaded.version
+
+    loaded = LoadedAsset(data, spec_version, data_version, source_stamp=stamp)
+    with _lock:
+        _loaded[key] = loaded
+    resident_set.loaded(key[0], time.perf_counter() - started)
+    resident_set.account(key[0], f"asset {key[1]}", frame_bytes(data))
+    return loaded.data, loaded.version
+
+
+def _evict(specification_id: str):
+    with _lock:
+        for key in [k for k in _loaded if k[0] == specification_id]:
+            del _loaded[key]
+
+
+resident_set.register_evictor(_evict)
+
+
+def asset_stamp(specification_id: str, spec, asset_key="data"):
+    """Cheap change-detection for a specification and its data asset, without reading the asset: the content hash of its compiled
+    copy, or the modification time and size of its file under SIMPSONS_ASSET_ROOT. None if there is neither."""
+    spec_version = spec_fingerprint(spec)
+    meta = compiled.read_meta(specification_id, spec_version, asset_key)
+    if meta is not None:
+        return f"{spec_version}-{meta['content_hash']}"
+    stamp = tally.source_stamp(tally.asset_source(spec, asset_key))
+    return None if stamp is None else f"{spec_version}-{stamp[0]}-{stamp[1]}"
+
+
+def read_uncached(specification_id: str, spec, asset_key="data"):
+    """(dataframe, version) for a data asset as load_data() would read it, but without keeping it, counting it towards the memory
+    budget or sharing it; for occasional passes over every specification (e.g. SimpsonsData.validation)."""
+    spec_version = spec_fingerprint(spec)
+    data, data_version, _, _ = _read_source(specification_id, spec, asset_key, spec_version, None)
+    return data, f"{spec_version}-{data_version}"
+
+
+def read_asset(spec, asset_key="data"):
+    """Read a data asset from its source rather than any compiled copy, tallying it if it is row-level. Not cached."""
+    if spec.detail.get("row_level", False):
+        return tally.tally_asset(spec, asset_key, tally.asset_source(spec, asset_key))
+    return spec.load_asset_dataframe(asset_key)
@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from SimpsonsData import datasets
+from SimpsonsData.regression import SUM_COLUMNS, fit_lines, regression_sums
+from SimpsonsData.resident import resident_set
+
+# Grouped regression sums for the continuous view, kept per specification, data version and grouping so that the fit lines for a
+# grouping are computed from all of the data only once. When rows are added to an "append_only" asset (see SimpsonsData.datasets),
+# the sums of the new rows, taken with the same shifts, are added to those of the old version, so a refresh costs in proportion
+# to the new rows.
+
+_lock = threading.Lock()
+_sums = {}  # (specification_id, x_col, y_col, group_col) -> (version, regression_sums())
+
+
+def cached_fits(specification_id: str, data: pd.DataFrame, version: str, x_col: str, y_col: str, group_col=None):
+    """As SimpsonsData.regression.group_fits(), from cached sums."""
+    pooled = fit_lines(_get_sums(specification_id, data, version, x_col, y_col, None))
+    if group_col is None:
+        return pooled
+    return pd.concat([fit_lines(_get_sums(specification_id, data, version, x_col, y_col, group_col)), pooled])
+
+
+def _get_sums(specification_id, data, version, x_col, y_col, group_col):
+    key = (specification_id, x_col, y_col, group_col)
+    with _lock:
+        cached = _sums.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    sums = regression_sums(data, x_col, y_col, group_col)
+    with _lock:
+        _sums[key] = (version, sums)
+    return sums
+
+
+def add_sums(sums: pd.DataFrame, more: pd.DataFrame) -> pd.DataFrame:
+    """Combine regression_sums() of two sets of rows, which must have been taken with the same shifts."""
+    sums, more = sums.set_axis(sums.index.astype(object)), more.set_axis(more.index.astype(object))
+    index = sums.index.union(more.index, sort=False)
+    sums, more = sums.reindex(index), more.reindex(index)
+    combined = {c: np.nan_to_num(sums[c].to_numpy()) + np.nan_to_num(more[c].to_numpy()) for c in SUM_COLUMNS}
+    combined["n"] = combined["n"].astype("int64")
+    combined["x_min"] = np.fmin(sums.x_min.to_numpy(), more.x_min.to_numpy())
+    combined["x_max"] = np.fmax(sums.x_max.to_numpy(), more.x_max.to_numpy())
+    combined["x_shift"] = sums.x_shift.iloc[0]
+    combined["y_shift"] = sums.y_shift.iloc[0]
+    return pd.DataFrame(combined, index=index)
+
+
+def _appended(specification_id, asset_key, old_version, new_version, new_rows):
+    if asset_key != "data":
+        return
+    with _lock:
+        entries = [(key, sums) for key, (version, sums) in _sums.items() if key[0] == specification_id and version == old_version]
+    for (_, x_col, y_col, group_col), sums in entries:
+        shift = (sums.x_shift.iloc[0], sums.y_shift.iloc[0])
+        more = regression_sums(new_rows, x_col, y_col, group_col, shift=shift)
+        with _lock:
+            _sums[(specification_id, x_col, y_col, group_col)] = (new_version, add_sums(sums, more))
+
+
+def _evict(specification_id: str):
+    with _lock:
+        for key in [k for k in _sums if k[0] == specification_id]:
+            del _sums[key]
+
+
+datasets.register_append_listener(_appended)
+resident_set.register_evictor(_evict)
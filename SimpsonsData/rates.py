@@ -0,0 +1,25 @@
+import pandas as pd
+
+# Outcome-rate computation shared by the explore and simulate views.
+# Works on a "tally" frame, i.e. one row per combination of categories with a count column (normally "N"), which is the
+# structure of the categorical data assets and of the simulated populations.
+
+
+def outcome_rates(tally: pd.DataFrame, group_cols, outcome_col: str, outcome_numerator, count_col="N"):
+    """Outcome rate for each group of a tally frame, computed in one vectorised groupby (no per-group Python calls).
+
+    group_cols may be a single column name or a list. Returns a dataframe indexed by the group columns with columns:
+    - outcome_N: the summed count for rows where outcome_col == outcome_numerator
+    - N: the summed count
+    - outcome_rate: 100 * outcome_N / N
+    """
+    if isinstance(group_cols, str):
+        group_cols = [group_cols]
+    counts = tally[count_col]
+    sums = pd.DataFrame({
+        "outcome_N": counts.where(tally[outcome_col] == outcome_numerator, 0),
+        "N": counts
+    })
+    sums = sums.groupby([tally[c] for c in group_cols], observed=True).sum()
+    sums["outcome_rate"] = 100 * sums.outcome_N / sums.N
+    return sums
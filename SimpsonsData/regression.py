@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+# Simple (one predictor) least-squares fits for the continuous view, computed for all groups at once from grouped sums:
+#   slope = (n.Sxy - Sx.Sy) / (n.Sxx - Sx^2), intercept = (Sy - slope.Sx) / n
+# The sums are of x and y shifted by a fixed offset (by default the overall means), which avoids loss of precision when the
+# values are large compared with their spread. Sums computed with the same shifts can be added together.
+
+SUM_COLUMNS = ["n", "sx", "sy", "sxy", "sxx"]
+
+
+def regression_sums(data: pd.DataFrame, x_col: str, y_col: str, group_col=None, shift=None):
+    """n, Σx, Σy, Σxy, Σx² (of shifted x, y), with min(x), max(x) and the shifts, for each group (indexed by group value) or
+    for all rows (a single row with index None). shift is an (x, y) pair and defaults to the means of x and y."""
+    x = data[x_col].to_numpy(dtype=float)
+    y = data[y_col].to_numpy(dtype=float)
+    x_shift, y_shift = (x.mean(), y.mean()) if shift is None else shift
+    xs, ys = x - x_shift, y - y_shift
+    if group_col is None:
+        sums = pd.DataFrame({"n": [len(x)], "sx": [xs.sum()], "sy": [ys.sum()], "sxy": [(xs * ys).sum()], "sxx": [(xs * xs).sum()],
+                             "x_min": [x.min()], "x_max": [x.max()]}, index=[None])
+    else:
+        parts = pd.DataFrame({"n": 1, "sx": xs, "sy": ys, "sxy": xs * ys, "sxx": xs * xs, "x_min": x, "x_max": x}, index=data.index)
+        grouped = parts.groupby(data[group_col], observed=True)
+        sums = grouped[SUM_COLUMNS].sum()
+        sums["x_min"] = grouped.x_min.min()
+        sums["x_max"] = grouped.x_max.max()
+    sums["x_shift"] = x_shift
+    sums["y_shift"] = y_shift
+    return sums
+
+
+def fit_lines(sums: pd.DataFrame):
+    """Slope, intercept and the fitted line end-points (at min and max x), for every row of regression_sums() at once."""
+    n = sums.n.to_numpy(dtype=float)
+    sx, sy, sxy, sxx = (sums[c].to_numpy() for c in SUM_COLUMNS[1:])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    # a single point, or all x equal, has no defined slope: show a flat line at the mean y
+    slope = np.where(np.isfinite(slope), slope, 0.0)
+    intercept = (sy - slope * sx) / n + sums.y_shift.to_numpy() - slope * sums.x_shift.to_numpy()
+    fits = pd.DataFrame({"slope": slope, "intercept": intercept, "x_min": sums.x_min.to_numpy(), "x_max": sums.x_max.to_numpy()},
+                        index=sums.index)
+    fits["y_at_min"] = fits.intercept + fits.slope * fits.x_min
+    fits["y_at_max"] = fits.intercept + fits.slope * fits.x_max
+    return fits
+
+
+def group_fits(data: pd.DataFrame, x_col: str, y_col: str, group_col=None):
+    """Fits for each group (indexed by group value) when group_col is given, followed by the pooled fit for all rows as the last row."""
+    pooled = fit_lines(regression_sums(data, x_col, y_col))
+    if group_col is None:
+        return pooled
+    return pd.concat([fit_lines(regression_sums(data, x_col, y_col, group_col)), pooled])
@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import OrderedDict
+
+from SimpsonsData.settings import env_int
+
+# Memory budget for what is held in-process for each specification: its loaded data assets (SimpsonsData.datasets) and the aggregates
+# derived from them (SimpsonsData.cube). Each holder accounts for the bytes it keeps for a specification; when the total is over
+# BUDGET_BYTES, the least recently used specifications are dropped from every holder (by the evictors they register) until it is
+# under, or until only the specification being loaded and the HOT ones are left. HOT specifications are never dropped, but their
+# bytes still count. A dropped specification is re-loaded on its next use; the time this takes is in the stats.
+BUDGET_BYTES = env_int("SIMPSONS_DATA_BUDGET_BYTES", 512 * 1024 * 1024)  # 0 = no limit
+HOT = frozenset(s.strip() for s in os.environ.get("SIMPSONS_HOT_SPECIFICATIONS", "").split(",") if s.strip())
+
+
+class ResidentSet:
+    def __init__(self, budget_bytes=BUDGET_BYTES, hot=HOT):
+        self.budget_bytes = budget_bytes
+        self.hot = hot
+        self._specs = OrderedDict()  # specification_id -> {kind: bytes}, least recently used first
+        self._evictors = []
+        self._evicted = set()  # specifications dropped and not yet re-loaded
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+        self.max_reload_seconds = 0.0
+
+    def register_evictor(self, evict):
+        """evict(specification_id) must drop everything the caller holds for the specification."""
+        self._evictors.append(evict)
+
+    def touch(self, specification_id: str):
+        with self._lock:
+            if specification_id in self._specs:
+                self._specs.move_to_end(specification_id)
+
+    def account(self, specification_id: str, kind: str, nbytes: int):
+        """Record that nbytes are now held for a specification under kind (replacing the previous amount), then enforce the budget."""
+        with self._lock:
+            sizes = self._specs.setdefault(specification_id, {})
+            self.bytes += nbytes - sizes.get(kind, 0)
+            sizes[kind] = nbytes
+            self._specs.move_to_end(specification_id)
+            victims = []
+            if self.budget_bytes > 0:
+                for candidate in list(self._specs):
+                    if self.bytes <= self.budget_bytes:
+                        break
+                    if candidate == specification_id or candidate in self.hot:
+                        continue
+                    self.bytes -= sum(self._specs.pop(candidate).values())
+                    self._evicted.add(candidate)
+                    self.evictions += 1
+                    victims.append(candidate)
+        for victim in victims:  # outside the lock: evictors take their own
+            for evict in self._evictors:
+                evict(victim)
+
+    def loaded(self, specification_id: str, seconds: float):
+        """Record the time taken to load a specification's data, counting it as a re-load if the specification had been dropped."""
+        with self._lock:
+            if specification_id in self._evicted:
+                self._evicted.discard(specification_id)
+                self.reloads += 1
+                self.reload_seconds += seconds
+                self.max_reload_seconds = max(self.max_reload_seconds, seconds)
+
+    def clear(self):
+        with self._lock:
+            self._specs.clear()
+            self._evicted.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"specifications": len(self._specs), "bytes": self.bytes, "budget_bytes": self.budget_bytes,
+                    "evictions": self.evictions, "reloads": self.reloads, "reload_seconds": round(self.reload_seconds, 4),
+                    "max_reload_seconds": round(self.max_reload_seconds, 4)}
+
+
+resident_set = ResidentSet()
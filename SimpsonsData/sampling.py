@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+# Reduction of large datasets for plotting: the continuous view shows either a sample of the points or a binned density in
+# place of every point once the data exceeds a size threshold. Fit lines should still be computed from the full data.
+
+
+def stratified_sample(data: pd.DataFrame, max_points: int, group_col=None, min_per_group=50, seed=0):
+    """At most about max_points rows, allocated to groups in proportion to their size but with at least min_per_group rows from each
+    group (or all of its rows if fewer). The sample is deterministic for a given seed and keeps the original row order."""
+    if len(data) <= max_points:
+        return data
+    rng = np.random.default_rng(seed)
+    if group_col is None:
+        return data.iloc[np.sort(rng.choice(len(data), max_points, replace=False))]
+
+    sizes = data[group_col].value_counts()  # includes zero counts for unused categories, which do no harm
+    quotas = np.minimum(sizes, np.maximum(min_per_group, np.round(max_points * sizes / len(data)))).astype(int)
+    # rank rows within their group in a random order and keep those within quota
+    shuffled = data.iloc[rng.permutation(len(data))]
+    rank = shuffled.groupby(group_col, observed=True).cumcount()
+    keep = rank.to_numpy() < shuffled[group_col].map(quotas).to_numpy()
+    return shuffled[keep].sort_index()
+
+
+def density_grid(x, y, bins=60, x_range=None, y_range=None):
+    """2-D histogram of points: returns (x bin centres, y bin centres, counts[y, x]) ready for a Plotly heatmap or contour."""
+    x_range = (np.min(x), np.max(x)) if x_range is None else x_range
+    y_range = (np.min(y), np.max(y)) if y_range is None else y_range
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=[x_range, y_range])
+    return (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2, counts.T.astype(np.int32)
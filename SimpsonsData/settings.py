@@ -0,0 +1,21 @@
+import os
+
+# Application-wide settings come from environment variables (Application Settings when deployed as an Azure Function).
+# See "Application Settings" in the README.
+
+
+def env_flag(name: str, default=False):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int):
+    value = os.environ.get(name)
+    return default if value is None or value == "" else int(value)
+
+
+def env_float(name: str, default: float):
+    value = os.environ.get(name)
+    return default if value is None or value == "" else float(value)
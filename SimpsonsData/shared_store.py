@@ -0,0 +1,174 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: there, the store is not used and each process keeps its own copy of the data
+    fcntl = None
+
+# Store of loaded data assets in memory-mapped files, so that the processes of a multi-worker server (see gunicorn.conf.py) share one
+# copy of each asset rather than holding one each. Put SHARED_DIR on a memory-backed filesystem (e.g. /dev/shm/simpsons).
+# The first process to load an asset writes its columns to a file: numeric columns as raw arrays and the others as categorical codes,
+# with the categories in a JSON header. A manifest alongside names the current file and records the versions (see SimpsonsData.datasets);
+# its modification time is when any process last checked the asset against its source, so the source is re-read about once per
+# revalidation period across all the processes rather than once in each. Loading is serialised per asset with a lock file, so the
+# other processes wait and then map the file rather than loading the asset themselves.
+# Mapped frames are read-only and share the file's pages. When an asset changes, the files of earlier versions are deleted; the
+# operating system keeps the pages of a deleted file for as long as any process still has it mapped, and frees them after.
+SHARED_DIR = os.environ.get("SIMPSONS_SHARED_DIR", "")
+
+MAGIC = b"SIMPSHM1"
+ALIGN = 64
+
+_mapped = weakref.WeakValueDictionary()  # path -> np.memmap, for the stats
+_counter_lock = threading.Lock()
+counters = {"published": 0, "refreshed": 0, "attached": 0, "failed": 0}
+
+
+def enabled():
+    return SHARED_DIR != "" and fcntl is not None
+
+
+def _count(counter):
+    with _counter_lock:
+        counters[counter] += 1
+
+
+def _stub(specification_id: str, asset_key: str):
+    return os.path.join(SHARED_DIR, f"{specification_id}.{asset_key}")
+
+
+class Published:
+    """The manifest of a shared asset. fresh is True if it was checked against the source less than max_age seconds ago."""
+    def __init__(self, manifest: dict, fresh: bool):
+        self.path = os.path.join(SHARED_DIR, manifest["file"])
+        self.spec_version = manifest["spec_version"]
+        self.data_version = manifest["data_version"]
+        self.source_stamp = manifest.get("source_stamp")
+        self.fresh = fresh
+
+
+@contextmanager
+def locked(specification_id: str, asset_key="data"):
+    """Hold the (inter-process) lock for an asset while checking, loading or publishing it."""
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    with open(f"{_stub(specification_id, asset_key)}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def lookup(specification_id: str, spec_version: str, max_age: float, asset_key="data"):
+    """The Published asset for this version of the specification, or None if there is none (or its file has gone)."""
+    manifest_path = f"{_stub(specification_id, asset_key)}.json"
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        checked = os.stat(manifest_path).st_mtime
+    except (FileNotFoundError, ValueError):
+        return None
+    published = Published(manifest, time.time() - checked < max_age)
+    if published.spec_version != spec_version or not os.path.exists(published.path):
+        return None
+    return published
+
+
+def publish(specification_id: str, spec_version: str, data_version: str, source_stamp, data: pd.DataFrame, asset_key="data"):
+    """Write a typed frame (see SimpsonsData.compiled.typed_frame) as the current version of an asset and delete earlier versions.
+    If this version is already published, it is only marked as checked. Call while holding locked()."""
+    stub = _stub(specification_id, asset_key)
+    file_name = f"{os.path.basename(stub)}.{spec_version}-{data_version}.cols"
+    path = os.path.join(SHARED_DIR, file_name)
+    if not os.path.exists(path):
+        write_columns(data, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        _count("published")
+    else:
+        _count("refreshed")
+    manifest = {"file": file_name, "spec_version": spec_version, "data_version": data_version, "source_stamp": source_stamp}
+    with open(f"{stub}.json.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{stub}.json.tmp", f"{stub}.json")  # also sets the checked time
+
+    for old in glob.glob(f"{glob.escape(stub)}.*.cols"):
+        if old != path:
+            try:
+                os.remove(old)  # processes which still have it mapped keep their pages until they let go of the frame
+            except OSError:
+                pass
+    return Published(manifest, True)
+
+
+def write_columns(data: pd.DataFrame, path: str):
+    columns = []
+    arrays = []
+    offset = 0
+    for col in data.columns:
+        series = data[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            array = series.cat.codes.to_numpy()
+            column = {"name": col, "categories": series.cat.categories.tolist(), "ordered": bool(series.cat.ordered)}
+        else:
+            array = series.to_numpy()
+            if array.dtype.kind not in "biuf":
+                raise ValueError(f"Column {col} must be numeric or categorical to be shared, not {series.dtype}")
+            column = {"name": col}
+        offset = -(-offset // ALIGN) * ALIGN
+        column.update({"dtype": array.dtype.str, "offset": offset})
+        columns.append(column)
+        arrays.append(np.ascontiguousarray(array))
+        offset += array.nbytes
+    header = json.dumps({"rows": len(data), "columns": columns}).encode("utf-8")
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+    with open(path, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for column, array in zip(columns, arrays):
+            f.seek(start + column["offset"])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+
+
+def attach(published: Published) -> pd.DataFrame:
+    """A read-only frame whose columns are views on the memory-mapped file of a published asset (no copy is made)."""
+    with open(published.path, "rb") as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{published.path} is not a shared asset file")
+        header_length = int.from_bytes(prefix[len(MAGIC):], "little")
+        header = json.loads(f.read(header_length))
+    start = -(-(len(MAGIC) + 8 + header_length) // ALIGN) * ALIGN
+    mapped = np.memmap(published.path, mode="r")
+    rows = header["rows"]
+    columns = {}
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        array = mapped[start + column["offset"]:start + column["offset"] + rows * dtype.itemsize].view(dtype)
+        if "categories" in column:
+            columns[column["name"]] = pd.Categorical.from_codes(array, categories=column["categories"], ordered=column["ordered"])
+        else:
+            columns[column["name"]] = array
+    _mapped[published.path] = mapped
+    _count("attached")
+    return pd.DataFrame(columns, copy=False)
+
+
+def stats():
+    maps = list(_mapped.values())
+    with _counter_lock:
+        return {**counters, "mapped_files": len(maps), "mapped_bytes": sum(m.nbytes for m in maps)}
+
+
+def report_failure(specification_id: str, asset_key: str, ex: Exception):
+    _count("failed")
+    logging.warning(f"Could not share data asset {specification_id}/{asset_key}; this process keeps its own copy: {ex!r}")
@@ -0,0 +1,227 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from SimpsonsData.rates import outcome_rates
+
+# The categorical simulator, independent of Dash so that it can also be driven programmatically.
+# Simulation parameters are a plain (JSON-compatible) structure keyed by category:
+#   {
+#       "col2_category": the value of simulate_categories[1] whose percentage is set by the slider,
+#       "counts": {col1 value: number of individuals},
+#       "col2_pc": {col1 value: % of those individuals who have col2_category},
+#       "base_rates": {col1 value: {col2 value: % outcome rate}}
+#   }
+# where col1 and col2 are the two columns in the Specification "simulate_categories".
+
+NOT_OUTCOME = "not"  # outcome value used for the complement of outcome_numerator in simulated data
+
+
+def starting_params(data: pd.DataFrame, sim_cols, outcome_col: str, outcome_numerator):
+    """Simulation parameters matching the (tally) data of a Specification.
+    Raises ValueError if the second simulation column is not binary or the data has no rows for a combination of the two columns."""
+    col2_values = sorted(data[sim_cols[1]].unique())
+    if len(col2_values) != 2:
+        raise ValueError("'simulate_categories' is mis-specified")
+    col2_category = col2_values[0]
+
+    counts = data.groupby(sim_cols[0], observed=True).N.sum()
+    col2_pc = outcome_rates(data, sim_cols[0], sim_cols[1], col2_category).outcome_rate.astype(int)
+    base_pc = outcome_rates(data, sim_cols, outcome_col, outcome_numerator).outcome_rate
+    missing = [f"{sim_cols[0]}={cat1}, {sim_cols[1]}={cat2}" for cat1 in counts.index for cat2 in col2_values
+               if (cat1, cat2) not in base_pc.index]
+    if len(missing) > 0:
+        raise ValueError(f"no rows for {'; '.join(missing)}")
+    # generally round the percentages to integers but some situations may have very small values
+    if base_pc.median() > 20:
+        base_pc = base_pc.round(0).astype(int)
+    else:
+        base_pc = base_pc.round(2)
+
+    return {
+        "col2_category": col2_category,
+        "counts": dict(zip(counts.index, counts.tolist())),
+        "col2_pc": dict(zip(col2_pc.index, col2_pc.tolist())),
+        "base_rates": {cat1: {cat2: base_pc.loc[(cat1, cat2)].item() for cat2 in col2_values} for cat1 in counts.index}
+    }
+
+
+def validate_params(params):
+    """Check and convert simulation parameters which may have come from user input.
+    Returns (params, errors) where params has float values and errors maps field names (e.g. "counts[A]") to messages.
+    When errors is not empty, params is None."""
+    errors = {}
+
+    def number(field, value, upper=None):
+        try:
+            x = float(value)
+        except (TypeError, ValueError):
+            errors[field] = "must be a number"
+            return None
+        if not math.isfinite(x) or x < 0 or (upper is not None and x > upper):
+            errors[field] = "must be between 0 and 100" if upper is not None else "must not be negative"
+            return None
+        return x
+
+    if not isinstance(params, dict):
+        return None, {"params": "missing"}
+    for key in ["col2_category", "counts", "col2_pc", "base_rates"]:
+        if key not in params:
+            errors[key] = "missing"
+        elif key != "col2_category" and not isinstance(params[key], dict):
+            errors[key] = "must be keyed by category"
+    if len(errors) > 0:
+        return None, errors
+
+    col2_category = params["col2_category"]
+    clean = {"col2_category": col2_category, "counts": {}, "col2_pc": {}, "base_rates": {}}
+    col2_values = None
+    for cat1, count in params["counts"].items():
+        clean["counts"][cat1] = number(f"counts[{cat1}]", count)
+        clean["col2_pc"][cat1] = number(f"col2_pc[{cat1}]", params["col2_pc"].get(cat1), upper=100)
+        rates = params["base_rates"].get(cat1)
+        if not isinstance(rates, dict) or len(rates) != 2 or col2_category not in rates:
+            errors[f"base_rates[{cat1}]"] = f"must have two values, including '{col2_category}'"
+            continue
+        if col2_values is not None and set(rates) != col2_values:
+            errors[f"base_rates[{cat1}]"] = "must have the same categories for every row"
+        col2_values = set(rates)
+        clean["base_rates"][cat1] = {cat2: number(f"base_rates[{cat1}][{cat2}]", rate, upper=100) for cat2, rate in rates.items()}
+    if len(clean["counts"]) == 0:
+        errors["counts"] = "no categories"
+
+    return (None, errors) if len(errors) > 0 else (clean, errors)
+
+
+def expected_counts(params, sim_cols, outcome_col: str, outcome_numerator):
+    """The expected tally frame (columns: sim_cols, outcome_col, N) for validated simulation parameters."""
+    cat1 = list(params["counts"])
+    col2_category = params["col2_category"]
+    col2_other = [c for c in params["base_rates"][cat1[0]] if c != col2_category][0]
+    count = np.array([params["counts"][c] for c in cat1])
+    pc = 0.01 * np.array([params["col2_pc"][c] for c in cat1])
+    # rows: col1 x col2 x outcome
+    n_col2 = np.stack([count * pc, count * (1 - pc)], axis=1)
+    rate = 0.01 * np.array([[params["base_rates"][c][col2_category], params["base_rates"][c][col2_other]] for c in cat1])
+    n = np.stack([n_col2 * rate, n_col2 * (1 - rate)], axis=2)
+    return pd.DataFrame({
+        sim_cols[0]: np.repeat(cat1, 4),
+        sim_cols[1]: np.tile(np.repeat([col2_category, col2_other], 2), len(cat1)),
+        outcome_col: np.tile([outcome_numerator, NOT_OUTCOME], 2 * len(cat1)),
+        "N": n.ravel()
+    })
+
+
+def simulated_rates(params, sim_cols, outcome_col: str, outcome_numerator, facet=False):
+    """Outcome rate (%) by sim_cols[1] (and by sim_cols[0] if facet) for validated simulation parameters. Returns a Series."""
+    data = expected_counts(params, sim_cols, outcome_col, outcome_numerator)
+    return outcome_rates(data, sim_cols if facet else sim_cols[1], outcome_col, outcome_numerator).outcome_rate
+
+
+def monte_carlo(params, sim_cols, replicates=10000, level=95, seed=None):
+    """Stochastic version of the simulation: draws `replicates` populations in one batch of binomial samples (no per-replicate
+    Python or pandas work). Individuals in each col1 category are split between the col2 categories with probability col2_pc and each
+    has the outcome with probability equal to the base rate.
+
+    Returns a dict with:
+    - "aggregate": dataframe indexed by col2 value, with the mean outcome rate (%) over replicates and the lower/upper limits of the
+      central `level`% interval: columns outcome_rate, lower, upper
+    - "facets": as aggregate, indexed by (col1 value, col2 value)
+    - "reversal_fraction": the fraction of replicates in which the aggregate difference in outcome rate between the two col2 categories
+      has the opposite sign to the difference within every col1 category (i.e. the paradox appears)
+    """
+    cat1 = list(params["counts"])
+    col2_category = params["col2_category"]
+    col2_values = [col2_category, [c for c in params["base_rates"][cat1[0]] if c != col2_category][0]]
+    count = np.round([params["counts"][c] for c in cat1]).astype(np.int64)
+    pc = 0.01 * np.array([params["col2_pc"][c] for c in cat1])
+    rate = 0.01 * np.array([[params["base_rates"][c][c2] for c2 in col2_values] for c in cat1])
+
+    rng = np.random.default_rng(seed)
+    n_first = rng.binomial(count, pc, size=(replicates, len(cat1)))
+    n_cells = np.stack([n_first, count - n_first], axis=2)  # replicate x col1 x col2
+    hits = rng.binomial(n_cells, rate)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        facet_rates = 100 * hits / n_cells
+        aggregate_rates = 100 * hits.sum(axis=1) / n_cells.sum(axis=1)  # replicate x col2
+
+    # reversal: aggregate difference has the opposite sign to all of the within-category differences (an empty cell counts as no reversal)
+    aggregate_sign = np.sign(aggregate_rates[:, 0] - aggregate_rates[:, 1])
+    facet_sign = np.sign(facet_rates[:, :, 0] - facet_rates[:, :, 1])
+    reversed_ = (aggregate_sign != 0) & np.all(facet_sign == -aggregate_sign[:, None], axis=1)
+
+    tail = (100 - level) / 2
+
+    def summarise(rates, index):
+        rates = rates.reshape(replicates, -1)
+        return pd.DataFrame({
+            "outcome_rate": np.nanmean(rates, axis=0),
+            "lower": np.nanpercentile(rates, tail, axis=0),
+            "upper": np.nanpercentile(rates, 100 - tail, axis=0)
+        }, index=index)
+
+    return {
+        "aggregate": summarise(aggregate_rates, pd.Index(col2_values, name=sim_cols[1])),
+        "facets": summarise(facet_rates, pd.MultiIndex.from_product([cat1, col2_values], names=sim_cols)),
+        "reversal_fraction": reversed_.mean()
+    }
+
+
+def sweep_parameters(params):
+    """The parameters which can be swept: ("col2_pc", col1 value) and ("base_rates", col1 value, col2 value) for every category."""
+    axes = [("col2_pc", cat1) for cat1 in params["col2_pc"]]
+    axes += [("base_rates", cat1, cat2) for cat1, rates in params["base_rates"].items() for cat2 in rates]
+    return axes
+
+
+def sweep(params, axes, resolution=101):
+    """Evaluate the expected aggregate outcome rates over a grid of values (0 to 100%) for one or two of the percentage parameters,
+    all other parameters being held at their values in params. axes is a list of one or two of the entries from sweep_parameters().
+
+    Everything is computed as arrays over the whole grid at once. Returns a dict with:
+    - "values": the grid values (%) for each axis
+    - "col2_values": [col2_category, the other col2 value]
+    - "aggregate_rates": expected aggregate outcome rate (%) for each col2 value; shape (resolution,) * len(axes) + (2,)
+      with the first axis varying along the last grid dimension (i.e. [y, x] for a 2-D sweep)
+    - "reversal": boolean array, shape (resolution,) * len(axes), true where the aggregate difference between the col2 categories has the
+      opposite sign to the (expected) difference within every col1 category
+    """
+    if len(axes) not in (1, 2):
+        raise ValueError("sweep over one or two parameters")
+    cat1 = list(params["counts"])
+    col2_category = params["col2_category"]
+    col2_values = [col2_category, [c for c in params["base_rates"][cat1[0]] if c != col2_category][0]]
+
+    values = np.linspace(0, 100, resolution)
+    grid_shape = (resolution,) * len(axes)
+    # parameter arrays broadcast over the grid: pc is grid x col1, rate is grid x col1 x col2
+    pc = np.broadcast_to(0.01 * np.array([params["col2_pc"][c] for c in cat1]), grid_shape + (len(cat1),)).copy()
+    rate = np.broadcast_to(0.01 * np.array([[params["base_rates"][c][c2] for c2 in col2_values] for c in cat1]),
+                           grid_shape + (len(cat1), 2)).copy()
+    for i, axis in enumerate(axes):
+        # first axis varies along the last grid dimension (x), second along the first (y)
+        grid_values = 0.01 * values.reshape([resolution if d == len(axes) - 1 - i else 1 for d in range(len(axes))])
+        if axis[0] == "col2_pc":
+            pc[..., cat1.index(axis[1])] = grid_values
+        elif axis[0] == "base_rates":
+            rate[..., cat1.index(axis[1]), col2_values.index(axis[2])] = grid_values
+        else:
+            raise ValueError(f"cannot sweep {axis[0]}")
+
+    count = np.array([params["counts"][c] for c in cat1], dtype=float)
+    n_cells = count[:, None] * np.stack([pc, 1 - pc], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aggregate_rates = 100 * (n_cells * rate).sum(axis=-2) / n_cells.sum(axis=-2)
+
+    aggregate_sign = np.sign(aggregate_rates[..., 0] - aggregate_rates[..., 1])
+    within_sign = np.sign(rate[..., 0] - rate[..., 1])
+    reversal = (aggregate_sign != 0) & np.all(within_sign == -aggregate_sign[..., None], axis=-1)
+
+    return {
+        "values": [values] * len(axes),
+        "col2_values": col2_values,
+        "aggregate_rates": aggregate_rates,
+        "reversal": reversal
+    }
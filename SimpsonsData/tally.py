@@ -0,0 +1,94 @@
+"""Build the "N"-tallied frame used by the categorical views from a row-level CSV (one row per individual).
+Run from the repository root to write a tally file which can then be used as an ordinary categorical data asset:
+python -m SimpsonsData.tally ROWS.csv TALLY.csv [--columns COL ...] [--chunk-rows N]
+"""
+import argparse
+import logging
+import os
+
+import pandas as pd
+
+from SimpsonsData.settings import env_int
+
+# Row-level files are read CHUNK_ROWS rows at a time and each chunk is reduced to counts before the next is read, so memory is
+# bounded by the chunk size and the number of distinct combinations of category values, not by the number of rows.
+# Streaming needs a file path: data assets are looked for under ASSET_ROOT (the same relative paths as in the asset_map). Without
+# it, the asset is loaded whole through the specification, which gives the same result but not the memory bound.
+CHUNK_ROWS = env_int("SIMPSONS_TALLY_CHUNK_ROWS", 100000)
+ASSET_ROOT = os.environ.get("SIMPSONS_ASSET_ROOT", "")
+
+
+def _counts(rows: pd.DataFrame, columns) -> pd.Series:
+    if columns is not None:
+        rows = rows[columns]
+    return rows.astype(str).value_counts(sort=False)
+
+
+def _as_tally(counts: pd.Series) -> pd.DataFrame:
+    return counts.astype("int64").rename("N").sort_index().reset_index()
+
+
+def tally_rows(source, columns=None, chunk_rows=CHUNK_ROWS) -> pd.DataFrame:
+    """Tally a row-level CSV (path or file-like), streaming through it. All columns, or those listed, are treated as categories;
+    values are read as strings and missing values are kept as empty strings rather than dropped."""
+    total = None
+    for chunk in pd.read_csv(source, usecols=columns, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+        counts = _counts(chunk, columns)
+        total = counts if total is None else total.add(counts, fill_value=0)
+    if total is None:
+        raise ValueError("No rows to tally")
+    return _as_tally(total)
+
+
+def tally_frame(rows: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """As tally_rows(), for a row-level frame which has already been loaded."""
+    return _as_tally(_counts(rows.fillna(""), columns))
+
+
+def asset_source(spec, asset_key="data"):
+    """Path of a data asset under ASSET_ROOT, or None if that is not set or the file is not there."""
+    if ASSET_ROOT == "" or asset_key not in spec.asset_map:
+        return None
+    path = os.path.join(ASSET_ROOT, spec.asset_map[asset_key])
+    return path if os.path.isfile(path) else None
+
+
+def source_stamp(path):
+    """Cheap change-detection for a source file (None when there is no path)."""
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]  # a list, so that it compares equal after a round trip through JSON (shared store)
+
+
+def tally_asset(spec, asset_key="data", source=None) -> pd.DataFrame:
+    """Tally a row-level data asset, streaming from source if given."""
+    columns = spec.detail.get("tally_columns", None)
+    if source is not None:
+        return tally_rows(source, columns)
+    logging.info(f"No file under SIMPSONS_ASSET_ROOT for row-level asset '{spec.asset_map.get(asset_key)}'; loading it whole")
+    try:
+        # parsed as tally_rows() parses it, so that the category values do not depend on how the file was read
+        rows = spec.load_asset_dataframe(asset_key, dtype=str, keep_default_na=False)
+    except TypeError:
+        logging.warning(f"Row-level asset '{spec.asset_map.get(asset_key)}' could not be read as text; numeric-looking values "
+                        "may be tallied differently from a streamed read")
+        rows = spec.load_asset_dataframe(asset_key)
+    return tally_frame(rows, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rows")
+    parser.add_argument("tally")
+    parser.add_argument("--columns", nargs="+", default=None, help="the category columns to keep (default: all)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    tally = tally_rows(args.rows, args.columns, args.chunk_rows)
+    tally.to_csv(args.tally, index=False)
+    print(f"{tally.N.sum()} rows tallied to {len(tally)} combinations")
+
+
+if __name__ == "__main__":
+    main()
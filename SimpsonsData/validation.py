@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from SimpsonsData.datasets import REVALIDATE_SECONDS, asset_stamp, read_uncached, spec_fingerprint
+from SimpsonsData.settings import env_int
+
+# Checks of specifications against the rules for their data (see "detail" and "asset_map" in the README), for the /validate route.
+# Specifications are checked concurrently. Each result is cached against a stamp of the specification and its data asset which can be
+# had without reading the asset (see SimpsonsData.datasets.asset_stamp), so a specification is only re-read and re-checked when it or
+# its data has changed. Assets with no such stamp are re-checked at most every SIMPSONS_DATA_REVALIDATE seconds. Failures to load
+# are not cached. Assets are read for checking without being kept in memory or shared, so checking every specification (including
+# disabled ones) does not push the ones in use out of the memory budget (see SimpsonsData.resident).
+WORKERS = env_int("SIMPSONS_VALIDATE_WORKERS", 8)
+
+_lock = threading.Lock()
+_results = {}  # specification_id -> ValidationResult
+
+
+class ValidationResult:
+    def __init__(self, specification_id, problems, version=None, rows=None, stamp=None):
+        self.specification_id = specification_id
+        self.problems = problems  # list of strings; empty if the specification is valid
+        self.version = version
+        self.rows = rows
+        self.stamp = stamp  # SimpsonsData.datasets.asset_stamp() when checked
+        self.checked = time.time()
+
+    @property
+    def ok(self):
+        return len(self.problems) == 0
+
+    def to_dict(self):
+        return {"specification_id": self.specification_id, "ok": self.ok, "problems": self.problems, "version": self.version,
+                "rows": self.rows, "checked": self.checked}
+
+
+def check_columns(data: pd.DataFrame, detail: dict):
+    """Problems with the columns of a data asset given the column roles declared in a specification's detail."""
+    problems = []
+    columns = set(data.columns)
+
+    def missing(role, cols):
+        absent = [c for c in cols if c not in columns]
+        if absent:
+            problems.append(f"{role} column(s) not in data: {', '.join(map(str, absent))}")
+        return len(absent) > 0
+
+    if "continuous_cols" in detail:
+        continuous_cols = detail["continuous_cols"]
+        if not isinstance(continuous_cols, list) or len(continuous_cols) != 2:
+            return problems + ["continuous_cols must be a list of two column headings"]
+        if not missing("continuous_cols", continuous_cols):
+            problems += [f"continuous column {c} is not numeric" for c in continuous_cols if not is_numeric_dtype(data[c])]
+        if len(columns.difference(continuous_cols)) == 0:
+            problems.append("there must be at least one categorical column besides continuous_cols")
+        if detail.get("large_data_mode", "sample") not in ("sample", "density"):
+            problems.append("large_data_mode must be \"sample\" or \"density\"")
+        return problems
+
+    for role in ["outcome", "outcome_numerator", "outcome_rate_label", "initial_variable"]:
+        if role not in detail:
+            problems.append(f"{role} missing from detail")
+    if problems:
+        return problems
+
+    if "N" not in columns:
+        problems.append("no \"N\" (tally) column in data")
+    elif not is_numeric_dtype(data.N):
+        problems.append("\"N\" column is not numeric")
+    elif (data.N < 0).any():
+        problems.append("\"N\" column has negative values")
+
+    outcome_col = detail["outcome"]
+    if not missing("outcome", [outcome_col]):
+        outcome_values = data[outcome_col].unique()
+        if len(outcome_values) != 2:
+            problems.append(f"outcome column {outcome_col} has {len(outcome_values)} values; it must have two")
+        if detail["outcome_numerator"] not in outcome_values:
+            problems.append(f"outcome_numerator {detail['outcome_numerator']} is not a value of {outcome_col}")
+
+    missing("initial_variable", [detail["initial_variable"]])
+    missing("category_orders", list(detail.get("category_orders", None) or {}))
+
+    sim_cols = detail.get("simulate_categories", None)
+    if sim_cols is not None:
+        if not isinstance(sim_cols, list) or len(sim_cols) != 2:
+            problems.append("simulate_categories must be a list of two column headings")
+        elif not missing("simulate_categories", sim_cols) and data[sim_cols[1]].nunique() != 2:
+            problems.append(f"second simulate_categories column {sim_cols[1]} must have two values")
+    return problems
+
+
+def validate_specification(specification_id: str, spec) -> ValidationResult:
+    if "data" not in spec.asset_map:
+        return ValidationResult(specification_id, ["no \"data\" in asset_map"])
+    try:
+        stamp = asset_stamp(specification_id, spec)
+    except OSError:
+        stamp = None
+    with _lock:
+        cached = _results.get(specification_id)
+    if cached is not None and stamp is not None and cached.stamp == stamp:
+        return cached
+    if (cached is not None and stamp is None and cached.stamp is None and time.time() - cached.checked < REVALIDATE_SECONDS
+            and cached.version.startswith(f"{spec_fingerprint(spec)}-")):
+        return cached
+
+    try:
+        data, version = read_uncached(specification_id, spec)
+    except Exception as ex:
+        return ValidationResult(specification_id, [f"data asset could not be loaded: {ex!r}"])
+    result = ValidationResult(specification_id, check_columns(data, spec.detail), version=version, rows=len(data), stamp=stamp)
+    with _lock:
+        _results[specification_id] = result
+    return result
+
+
+def validate_specifications(specifications) -> list:
+    """Validate (specification_id, specification) pairs concurrently, returning ValidationResults in the same order."""
+    specifications = list(specifications)
+    if len(specifications) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(WORKERS, len(specifications))) as pool:
+        return list(pool.map(lambda item: validate_specification(*item), specifications))
@@ -1,14 +1,32 @@
 import logging
+import time
 
-from flask import Flask, render_template, session, request, abort, Blueprint
+from SimpsonsFlask import startup
 
-from pg_shared import prepare_app
-from pg_shared.dash_utils import add_dash_to_routes
-from SimpsonsFlask.dash_apps import dash_explore_categorical, dash_simulate_categorical, dash_explore_continuous
-from simpsons import PLAYTHING_NAME, core  # Langstrings, menu
+with startup.phase("import flask and pg_shared"):
+    from flask import Flask, render_template, session, request, abort, Blueprint, jsonify, Response, make_response
+
+    from pg_shared import prepare_app
+    from simpsons import PLAYTHING_NAME, core, menu, specification_items  # Langstrings
+    from SimpsonsFlask.activity import record_activity
+    from SimpsonsFlask import metrics
+    from SimpsonsFlask.page_cache import PageCache
+    from SimpsonsData.resident import resident_set
 
 plaything_root = core.plaything_root
 
+BEACON_MAX_EVENTS = 100  # limit on the activity records accepted in a single beacon request
+
+index_pages = PageCache(lambda: core.get_specifications())
+
+def shared_store_stats():
+    from SimpsonsData import shared_store  # imported here to keep numpy and pandas out of start-up
+    return shared_store.stats()
+
+metrics.register_stats("index_pages", index_pages.stats)
+metrics.register_stats("shared_store", shared_store_stats)
+metrics.register_stats("resident", resident_set.stats)
+
 # Using a blueprint is the neatest way of setting up a URL path which starts with the plaything name (see the bottom, when the blueprint is added to the app)
 # This strategy would also allow for a single Flask app to deliver more than one plaything, subject to some refactoring of app creation and blueprint addition.
 pt_bp = Blueprint(PLAYTHING_NAME, __name__, template_folder='templates')
@@ -16,25 +34,80 @@ pt_bp = Blueprint(PLAYTHING_NAME, __name__, template_folder='templates')
 @pt_bp.route("/")
 # Root shows set of index cards, one for each enabled plaything specification. There is no context language for this; lang is declared at specification level.
 # Order of cards follows alphanum sort of the specification ids. TODO consider sort by title.
+# The rendered page is cached per query string (see page_cache) and conditional GETs are answered with 304 Not Modified.
 def index():
-    core.record_activity("ROOT", None, session, referrer=request.referrer)
+    record_activity("ROOT", None, session, referrer=request.referrer)
+    metrics.lap("record_activity")
+    query_string = request.query_string.decode()
+    page = index_pages.get(query_string, lambda specifications: render_template("index_cards.html", specifications=specifications,
+                                                                                with_link=True, url_base=plaything_root, query_string=query_string))
+    metrics.lap("render")
 
-    return render_template("index_cards.html", specifications=core.get_specifications(),
-                           with_link=True, url_base=plaything_root, query_string=request.query_string.decode())
+    response = make_response(page.html)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.no_cache = True  # caches may keep the page but must revalidate it
+    return response.make_conditional(request)
 
 @pt_bp.route("/validate")
-# similar output style to root route, but performs some checks and shows error-case specifications and disabled specifications
+# checks all specifications, including disabled ones, against the column rules for their data (see SimpsonsData.validation).
+# Add ?format=json for machine-readable results.
 def validate():
-    core.record_activity("validate", None, session, referrer=request.referrer, tag=request.args.get("tag", None))
+    from SimpsonsData.validation import validate_specifications  # imported here to keep pandas out of start-up
+
+    record_activity("validate", None, session, referrer=request.referrer, tag=request.args.get("tag", None))
+    metrics.lap("record_activity")
+    specifications = specification_items(core.get_specifications(include_disabled=True))
+    metrics.lap("get_specification")
+    t0 = time.perf_counter()
+    results = validate_specifications(specifications)
+    metrics.lap("validate")
 
-    return render_template("index_cards.html",
-                           specifications=core.get_specifications(include_disabled=True, check_assets=["data"]),
-                           with_link=False)
+    if request.args.get("format", None) == "json":
+        return jsonify([result.to_dict() for result in results])
+    return render_template("validate.html", plaything_name=PLAYTHING_NAME, results=list(zip([spec for _, spec in specifications], results)),
+                           problem_count=sum(not result.ok for result in results), seconds=time.perf_counter() - t0)
 
 @pt_bp.route("/ping")
 def ping():
     return "OK"
 
+@pt_bp.route("/metrics")
+# request timings by view, specification and phase, and cache/activity counters, in the Prometheus text format
+def metrics_report():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@pt_bp.route("/startup")
+# timings of the start-up phases of this worker; with lazy start-up, this shows which views have been built so far
+def startup_report():
+    return jsonify(startup.report())
+
+@pt_bp.route("/beacon/<view_name>/<specification_id>", methods=["POST"])
+# Batched activity records from views which update in the browser rather than calling back to the server (see dash_apps/clientside)
+def beacon(view_name: str, specification_id: str):
+    if view_name not in menu:
+        abort(404)
+    try:
+        known = core.get_specification(specification_id) is not None
+    except Exception:
+        known = False
+    metrics.lap("get_specification", specification_id, found=known)
+    if not known:  # records are only accepted for real specifications
+        abort(404)
+    payload = request.get_json(force=True, silent=True)  # navigator.sendBeacon posts as text/plain
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        abort(400)
+
+    tag = request.args.get("tag", None)
+    metrics.lap("parse")
+    for event in events[:BEACON_MAX_EVENTS]:
+        if isinstance(event, dict):
+            record_activity(view_name, specification_id, session, activity=event.get("activity"), referrer="(beacon)", tag=tag)
+    metrics.lap("record_activity")
+
+    return "", 204
+
 # @pt_bp.route("/about/<specification_id>", methods=['GET'])
 # def about(specification_id: str):
 #     view_name = "about"
@@ -50,10 +123,27 @@ def ping():
 #                            about=spec.load_asset_markdown(view_name, render=True),
 #                            top_menu=spec.make_menu(menu, langstrings, plaything_root, view_name, query_string=request.query_string.decode()))
 
-app = prepare_app(Flask(__name__), url_prefix=plaything_root)
-app.register_blueprint(pt_bp, url_prefix=plaything_root)
+with startup.phase("create flask app"):
+    app = prepare_app(Flask(__name__), url_prefix=plaything_root)
+    app.register_blueprint(pt_bp, url_prefix=plaything_root)
+
+def make_view_app(dash_module):
+    # a separate Flask app for one Dash view, used by the lazy start-up dispatcher
+    from pg_shared.dash_utils import add_dash_to_routes
+    view_app = prepare_app(Flask(f"{__name__}.{dash_module.view_name}"), url_prefix=plaything_root)
+    add_dash_to_routes(view_app, dash_module, plaything_root)
+    return view_app
 
 # DASH Apps and route spec. NB these do need the URL prefix
-add_dash_to_routes(app, dash_explore_categorical, plaything_root)
-add_dash_to_routes(app, dash_simulate_categorical, plaything_root)
-add_dash_to_routes(app, dash_explore_continuous, plaything_root)
+if startup.LAZY_STARTUP:
+    app.wsgi_app = startup.LazyDashDispatcher(app.wsgi_app, make_view_app, plaything_root)
+else:
+    with startup.phase("import dash"):
+        from pg_shared.dash_utils import add_dash_to_routes
+    for view_name in startup.VIEW_MODULES:
+        dash_module = startup.import_view(view_name)
+        with startup.phase(f"build {view_name}"):
+            add_dash_to_routes(app, dash_module, plaything_root)
+
+app.wsgi_app = metrics.MetricsMiddleware(app.wsgi_app, plaything_root,
+                                         list(menu) + ["validate", "ping", "metrics", "startup", "beacon"])
@@ -0,0 +1,158 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from simpsons import core
+from SimpsonsData.settings import env_float, env_int
+from SimpsonsFlask import metrics
+
+# Buffered activity recording.
+# The views call record_activity() with the same arguments as core.record_activity(); events are queued and written to the activity
+# store by a background worker, in batches, when BATCH_SIZE events are waiting or FLUSH_SECONDS have passed. When the queue is full
+# (i.e. the store is slow or unavailable) record_activity() waits at most ENQUEUE_TIMEOUT seconds and then drops the event, counting
+# the drop, so callbacks are never held up for long. The queue is drained at shutdown.
+# The Flask session is copied when the event is queued because the worker runs outside the request context.
+MODE = os.environ.get("SIMPSONS_ACTIVITY_MODE", "buffered")  # or "inline" to call the sink directly in the request
+SINK = os.environ.get("SIMPSONS_ACTIVITY_SINK", "core")  # "core", "memory", or "file:<path>" (JSON lines)
+MAX_QUEUE = env_int("SIMPSONS_ACTIVITY_MAX_QUEUE", 10000)
+BATCH_SIZE = env_int("SIMPSONS_ACTIVITY_BATCH", 50)
+FLUSH_SECONDS = env_float("SIMPSONS_ACTIVITY_FLUSH_SECONDS", 2)
+ENQUEUE_TIMEOUT = env_float("SIMPSONS_ACTIVITY_ENQUEUE_TIMEOUT", 0.05)
+SHUTDOWN_TIMEOUT = 10
+
+
+class CoreSink:
+    """Writes to the activity store configured in pg_shared (Cosmos when deployed)."""
+    def write(self, events):
+        for view_name, specification_id, session, kwargs, _ in events:
+            core.record_activity(view_name, specification_id, session, **kwargs)
+
+
+class MemorySink:
+    """Keeps events in a list; for local development and the benchmarks (see benchmarks/bench_callbacks.py)."""
+    def __init__(self):
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+
+class FileSink:
+    """Appends events to a JSON-lines file; for local development."""
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, events):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for view_name, specification_id, session, kwargs, queued_at in events:
+                f.write(json.dumps({"view": view_name, "specification_id": specification_id, "session": session,
+                                    "time": queued_at, **kwargs}, default=str) + "\n")
+
+
+def make_sink(setting=SINK):
+    if setting == "memory":
+        return MemorySink()
+    if setting.startswith("file:"):
+        return FileSink(setting[len("file:"):])
+    return CoreSink()
+
+
+class ActivityRecorder:
+    def __init__(self, sink, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS, enqueue_timeout=ENQUEUE_TIMEOUT):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.enqueue_timeout = enqueue_timeout
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._stopping = False
+
+    def _ensure_worker(self):
+        # the worker thread is started on first use, and again in a forked child process (threads do not survive a fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._stopping = False
+                self._worker = threading.Thread(target=self._run, name="activity-recorder", daemon=True)
+                self._worker.start()
+                self._pid = os.getpid()
+
+    def record(self, view_name, specification_id, session, **kwargs):
+        """Queue an event; arguments as for core.record_activity()"""
+        self._ensure_worker()
+        event = (view_name, specification_id, None if session is None else dict(session), kwargs, time.time())
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+            self._count("queued")
+        except queue.Full:
+            self._count("dropped")
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event is None:  # shutdown sentinel
+                    self._write(batch)
+                    return
+                batch.append(event)
+            self._write(batch)
+
+    def _write(self, batch):
+        if len(batch) == 0:
+            return
+        try:
+            self.sink.write(batch)
+            self._count("written", len(batch))
+        except Exception as ex:
+            self._count("failed", len(batch))
+            logging.warning(f"Failed to write {len(batch)} activity records: {ex}")
+        self._count("batches")
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Write any queued events and stop the worker."""
+        if self._pid != os.getpid() or self._stopping:
+            return
+        self._stopping = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning("Activity queue still full at shutdown; queued records are lost")
+            return
+        self._worker.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["waiting"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return stats
+
+
+recorder = ActivityRecorder(make_sink())
+atexit.register(recorder.shutdown)
+metrics.register_stats("activity", recorder.stats)
+
+
+def record_activity(view_name, specification_id, session, **kwargs):
+    """Drop-in replacement for core.record_activity() which keeps the write to the activity store off the request path."""
+    if MODE == "inline":
+        recorder.sink.write([(view_name, specification_id, session, kwargs, time.time())])
+    else:
+        recorder.record(view_name, specification_id, session, **kwargs)
@@ -0,0 +1,26 @@
+import os
+from urllib.parse import quote, urlencode
+
+from simpsons import core
+
+# JavaScript for Dash clientside callbacks. Each <name>.js file in this folder is the body of an immediately-invoked function which
+# must end by returning the callback function; the shared activity beacon (see activity_beacon.js) is in scope as "beacon", and the
+# bar chart helpers in bar_figure.js are in scope too.
+
+_folder = os.path.dirname(__file__)
+
+
+def _read(name):
+    with open(os.path.join(_folder, name + ".js"), encoding="utf-8") as f:
+        return f.read()
+
+
+def clientside_function(name: str):
+    """Source of the named clientside callback, as accepted by app.clientside_callback()"""
+    return "(function () {\n" + _read("activity_beacon") + "\n" + _read("bar_figure") + "\n" + _read(name) + "\n})()"
+
+
+def beacon_url(view_name: str, specification_id: str, tag=None):
+    """URL of the plaything "beacon" route to which the browser sends batched activity records for a view."""
+    url = f"{core.plaything_root}/beacon/{quote(view_name)}/{quote(specification_id, safe='')}"
+    return url if tag is None else f"{url}?{urlencode({'tag': tag})}"
@@ -0,0 +1,42 @@
+// Batched activity recording for views which update in the browser.
+// Events are queued and POSTed to the plaything "beacon" route when a batch is full or when the page is hidden/closed,
+// rather than making a server request for each user interaction.
+var beacon = window.simpsonsBeacon;
+if (!beacon) {
+    beacon = window.simpsonsBeacon = {
+        queue: [],
+        url: null,
+        batchSize: 10,
+        record: function (url, activity, batchSize) {
+            if (this.url !== null && url !== this.url) {
+                this.flush();
+            }
+            this.url = url;
+            if (batchSize) {
+                this.batchSize = batchSize;
+            }
+            this.queue.push({activity: activity, client_time: new Date().toISOString()});
+            if (this.queue.length >= this.batchSize) {
+                this.flush();
+            }
+        },
+        flush: function () {
+            if (this.queue.length === 0 || this.url === null) {
+                return;
+            }
+            var body = JSON.stringify({events: this.queue});
+            this.queue = [];
+            if (!(navigator.sendBeacon && navigator.sendBeacon(this.url, body))) {
+                fetch(this.url, {method: "POST", body: body, keepalive: true, credentials: "same-origin"});
+            }
+        }
+    };
+    document.addEventListener("visibilitychange", function () {
+        if (document.visibilityState === "hidden") {
+            beacon.flush();
+        }
+    });
+    window.addEventListener("pagehide", function () {
+        beacon.flush();
+    });
+}
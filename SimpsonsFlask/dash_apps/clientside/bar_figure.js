@@ -0,0 +1,49 @@
+// Bar charts built in the browser the way plotly express builds them in the server-side versions of the views.
+// store must have the plotly template (for the colorway) and the specification's category_orders.
+
+// order category values as plotly express does: those listed in category_orders first, then the rest as they come
+function orderValues(values, categoryOrders, col) {
+    var listed = (categoryOrders && categoryOrders[col]) || [];
+    var ordered = listed.filter(function (v) { return values.indexOf(v) >= 0; });
+    values.forEach(function (v) {
+        if (ordered.indexOf(v) < 0) {
+            ordered.push(v);
+        }
+    });
+    return ordered;
+}
+
+function barFigure(store, rows, compare, facet, valueFn, valueLabel, hovertemplate) {
+    var colorway = store.template.layout.colorway;
+    var traces = [];
+    if (facet === "none") {
+        traces.push({
+            type: "bar", orientation: "v", x: rows.map(function (r) { return r[0]; }), y: rows.map(valueFn),
+            name: "", showlegend: false, marker: {color: colorway[0]},
+            hovertemplate: hovertemplate || (compare + "=%{x}<br>" + valueLabel + "=%{y}<extra></extra>")
+        });
+    } else {
+        var facetValues = orderValues(rows.map(function (r) { return r[1]; }).filter(function (v, i, a) { return a.indexOf(v) === i; }), store.category_orders, facet);
+        facetValues.forEach(function (fv, i) {
+            var facetRows = rows.filter(function (r) { return r[1] === fv; });
+            traces.push({
+                type: "bar", orientation: "v", x: facetRows.map(function (r) { return r[0]; }), y: facetRows.map(valueFn),
+                name: fv, legendgroup: fv, offsetgroup: fv, alignmentgroup: "True", showlegend: true,
+                marker: {color: colorway[i % colorway.length]},
+                hovertemplate: hovertemplate || (facet + "=" + fv + "<br>" + compare + "=%{x}<br>" + valueLabel + "=%{y}<extra></extra>")
+            });
+        });
+    }
+    var xaxis = {title: {text: compare}};
+    if (store.category_orders && store.category_orders[compare]) {
+        xaxis.categoryorder = "array";
+        xaxis.categoryarray = store.category_orders[compare];
+    }
+    return {
+        data: traces,
+        layout: {
+            template: store.template, xaxis: xaxis, yaxis: {title: {text: valueLabel}},
+            legend: {title: {text: facet === "none" ? "" : facet}, tracegroupgap: 0}, barmode: "group"
+        }
+    };
+}
@@ -0,0 +1,45 @@
+// Rebuilds the explore-categorical charts from the aggregate cube which the server sends on page load (see CategoricalCube.to_client).
+// The figures follow what plotly express produces in the server-side version of the view (see bar_figure.js).
+
+return function (compare_selected, facet_selected, store) {
+    var dc = window.dash_clientside;
+    if (!store || !compare_selected) {
+        return [dc.no_update, dc.no_update, dc.no_update, dc.no_update];
+    }
+    var triggered = (dc.callback_context.triggered || []).map(function (t) { return t.prop_id; });
+
+    // facet dropdown depends on category selected. If the user changed the category then reset the facet
+    var facet_options = {};
+    store.columns.forEach(function (c) {
+        if (c !== compare_selected) {
+            facet_options[c] = c;
+        }
+    });
+    facet_options["none"] = store.labels.none;
+    if (triggered.indexOf("compare_options.value") >= 0 || !(facet_selected in facet_options)) {
+        facet_selected = "none";
+    }
+
+    // activity log; the initial view is recorded by the server when it sends the cube
+    if (triggered.indexOf("cube_store.data") < 0) {
+        beacon.record(store.beacon_url, {compare_selected: compare_selected, facet_selected: facet_selected}, store.beacon_batch);
+    }
+
+    // rows are [compare value, (facet value), outcome_N, N]
+    var rows = store.tables[compare_selected][facet_selected];
+    var nIx = facet_selected === "none" ? 2 : 3;
+
+    var rateLabel = store.labels.outcome_rate;
+    var outcomeFigure = barFigure(store, rows, compare_selected, facet_selected,
+        function (r) { return 100 * r[nIx - 1] / r[nIx]; }, rateLabel, rateLabel + " = %{y:.2f}%");
+    outcomeFigure.layout.hovermode = "x";
+    outcomeFigure.layout.yaxis.ticksuffix = "%";
+    outcomeFigure.layout.margin = {t: 5, b: 10, r: 20, l: 50};
+
+    var countsFigure = barFigure(store, rows, compare_selected, facet_selected,
+        function (r) { return r[nIx]; }, "Count", null);
+    countsFigure.layout.yaxis.title.text = store.labels.input_count;
+    countsFigure.layout.margin = {t: 15, r: 20, l: 50};
+
+    return [facet_options, facet_selected, outcomeFigure, countsFigure];
+};
@@ -0,0 +1,103 @@
+// Live version of the simulate-categorical rate chart (SIMPSONS_CLIENTSIDE_SIMULATE). The expected outcome rates for the parameters
+// in sim_state are worked out here, as SimpsonsData.simulate.simulated_rates() does, and the chart is re-drawn as the inputs change
+// without calling the server. Changes are debounced: only the last of a quick run of changes (e.g. dragging a slider) is drawn, and
+// recorded with the activity beacon. The "random variation" chart needs many random populations, so it is still drawn by the server.
+
+var latest = 0;  // the most recent call; earlier calls still waiting out the debounce give up
+
+// as SimpsonsData.simulate.validate_params(), for the structure made by simulate_state.js
+function checkNumber(errors, field, value, upper) {
+    var x = (value === null || value === undefined || String(value).trim() === "") ? NaN : Number(value);
+    if (isNaN(x)) {
+        errors.push(field + " must be a number");
+        return null;
+    }
+    if (!isFinite(x) || x < 0 || (upper !== undefined && x > upper)) {
+        errors.push(field + (upper !== undefined ? " must be between 0 and 100" : " must not be negative"));
+        return null;
+    }
+    return x;
+}
+
+function compareValues(a, b) {
+    return a < b ? -1 : (a > b ? 1 : 0);
+}
+
+// rows of [col2 value, (col1 value), outcome rate %], sorted as the server-side view sorts them
+function simulatedRates(state, facet) {
+    var errors = [];
+    var cat1s = Object.keys(state.counts);
+    if (cat1s.length === 0) {
+        errors.push("counts no categories");
+    }
+    var col2Values = [state.col2_category];
+    Object.keys(state.base_rates[cat1s[0]] || {}).forEach(function (v) {
+        if (v !== state.col2_category) {
+            col2Values.push(v);
+        }
+    });
+    var cells = [];  // [col1 value, col2 value, individuals, with outcome]
+    cat1s.forEach(function (cat1) {
+        var count = checkNumber(errors, "counts[" + cat1 + "]", state.counts[cat1]);
+        var pc = checkNumber(errors, "col2_pc[" + cat1 + "]", state.col2_pc[cat1], 100);
+        var rates = state.base_rates[cat1] || {};
+        var shares = [pc / 100, 1 - pc / 100];
+        col2Values.forEach(function (cat2, i) {
+            var rate = checkNumber(errors, "base_rates[" + cat1 + "][" + cat2 + "]", rates[cat2], 100);
+            cells.push([cat1, cat2, count * shares[i], count * shares[i] * rate / 100]);
+        });
+    });
+    if (errors.length > 0) {
+        return {errors: errors};
+    }
+
+    var rows = [];
+    if (facet) {
+        cells.forEach(function (cell) {
+            rows.push([cell[1], cell[0], 100 * cell[3] / cell[2]]);
+        });
+        rows.sort(function (a, b) { return compareValues(a[0], b[0]) || compareValues(a[1], b[1]); });
+    } else {
+        col2Values.forEach(function (cat2) {
+            var n = 0, outcomeN = 0;
+            cells.filter(function (cell) { return cell[1] === cat2; }).forEach(function (cell) {
+                n += cell[2];
+                outcomeN += cell[3];
+            });
+            rows.push([cat2, 100 * outcomeN / n]);
+        });
+        rows.sort(function (a, b) { return compareValues(a[0], b[0]); });
+    }
+    return {errors: errors, rows: rows};
+}
+
+return function (sim_state, sim_options, config) {
+    var dc = window.dash_clientside;
+    var call = ++latest;
+    var options = sim_options || [];
+    if (!sim_state || !config || options.indexOf("stochastic") >= 0) {
+        return [dc.no_update, dc.no_update];
+    }
+    return new Promise(function (resolve) {
+        setTimeout(resolve, config.debounce_ms);
+    }).then(function () {
+        if (call !== latest) {
+            return [dc.no_update, dc.no_update];
+        }
+        var facet = options.indexOf("facet") >= 0;
+        var result = simulatedRates(sim_state, facet);
+        var hasError = result.errors.length > 0 ? "Sim parameter error: " + result.errors.join("; ") : null;
+        beacon.record(config.beacon_url, {has_error: hasError, stochastic: false}, config.beacon_batch);
+        if (hasError !== null) {
+            return [dc.no_update, hasError];
+        }
+
+        var rateLabel = config.labels.outcome_rate;
+        var figure = barFigure(config, result.rows, config.sim_cols[1], facet ? config.sim_cols[0] : "none",
+            function (r) { return r[r.length - 1]; }, rateLabel, rateLabel + " = %{y:.2f}%");
+        figure.layout.hovermode = "x";
+        figure.layout.yaxis.ticksuffix = "%";
+        figure.layout.margin = {t: 5, r: 20, l: 50};
+        return [figure, ""];
+    });
+};
@@ -0,0 +1,24 @@
+// Collects the values of the simulate-categorical inputs into the structure used by SimpsonsData.simulate:
+// {col2_category, counts: {cat1: n}, col2_pc: {cat1: %}, base_rates: {cat1: {cat2: %}}}
+// The inputs have pattern-matching ids, {type: "c1"|"c2"|"br", cat1, (cat2)}, which give the categories.
+
+return function (counts, col2_pcs, base_rates) {
+    var dc = window.dash_clientside;
+    var inputs = dc.callback_context.inputs_list;
+    if (!counts || counts.length === 0) {
+        return dc.no_update;
+    }
+    var state = {col2_category: null, counts: {}, col2_pc: {}, base_rates: {}};
+    inputs[0].forEach(function (input, i) {
+        state.counts[input.id.cat1] = counts[i];
+    });
+    inputs[1].forEach(function (input, i) {
+        state.col2_pc[input.id.cat1] = col2_pcs[i];
+        state.col2_category = input.id.cat2;
+    });
+    inputs[2].forEach(function (input, i) {
+        state.base_rates[input.id.cat1] = state.base_rates[input.id.cat1] || {};
+        state.base_rates[input.id.cat1][input.id.cat2] = base_rates[i];
+    });
+    return state;
+};
@@ -1,15 +1,27 @@
 # import logging
 
 from pg_shared.dash_utils import create_dash_app_util
-from simpsons import core, menu, Langstrings
+from simpsons import core, menu
+from SimpsonsFlask.activity import record_activity
+from SimpsonsFlask import metrics
+from SimpsonsData.cube import get_cube
+from SimpsonsData.settings import env_flag, env_int
+from SimpsonsFlask.dash_apps.clientside import beacon_url, clientside_function
+from SimpsonsFlask.figure_cache import figure_cache
+from SimpsonsFlask.view_models import view_models, parse_location
 from flask import session
 
 from dash import html, dcc, callback_context, no_update
 import plotly.express as px
+import plotly.io as pio
 from dash.dependencies import Output, Input  #, State
 
 view_name = "explore-categorical"  # this is required
 
+# Opt-in: send the aggregate cube to the browser on page load and re-draw the charts there when the drop-downs change
+CLIENTSIDE_RENDER = env_flag("SIMPSONS_CLIENTSIDE_EXPLORE")
+BEACON_BATCH = env_int("SIMPSONS_BEACON_BATCH", 10)
+
 def create_dash(server, url_rule, url_base_pathname):
     """Create a Dash view"""
     app = create_dash_app_util(server, url_rule, url_base_pathname)
@@ -42,6 +54,7 @@ def create_dash(server, url_rule, url_base_pathname):
                 ),
                 html.Div(
                     [
+                        dcc.Store(id="cube_store"),
                         dcc.Loading(
                             dcc.Graph(id="rates_chart", config={'displayModeBar': False}),
                             type="circle"
@@ -58,6 +71,10 @@ def create_dash(server, url_rule, url_base_pathname):
     ],
     className="wrapper"
     )
+
+    if CLIENTSIDE_RENDER:
+        add_clientside_callbacks(app)
+        return app.server
     
     # This callback handles: A) initial setup of the menu, langstring labels, drop-down options (also langstrings) AND B) the chart.
     # The callback_context is used to control whether or not A updates occur, as this should only occur on initial page load.
@@ -86,38 +103,27 @@ def create_dash(server, url_rule, url_base_pathname):
             ]
     )
     def update_chart(pathname, querystring, compare_selected, facet_selected):
-        specification_id = pathname.split('/')[-1]
-        tag = None
-        if len(querystring) > 0:
-            for param, value in [pv.split('=') for pv in querystring[1:].split("&")]:
-                if param == "tag":
-                    tag = value
-                    break
-        spec = core.get_specification(specification_id)
-        langstrings = Langstrings(spec.lang)
-
-        # the category table and configured column usage
-        outcome_col = spec.detail["outcome"]
-        outcome_numerator = spec.detail["outcome_numerator"]
-        outcome_rate_label = spec.detail["outcome_rate_label"]
-        input_count_label = spec.detail.get("input_count_label", langstrings.get("COUNT"))
-        initial_variable_col = spec.detail["initial_variable"]
-        category_orders = spec.detail.get("category_orders", None)
-        data = spec.load_asset_dataframe("data")
-        prop_categories = set(data.columns).difference({"N", outcome_col})  # the columns which the user can choose to explore.
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)  # column roles, labels and options for the specification
+        metrics.lap("get_specification", specification_id)
+        langstrings = model.langstrings
+
+        # the category table
+        cube = get_cube(specification_id, model.spec)
+        metrics.lap("load_data")
     
         if callback_context.triggered_id == "location":
             # initial load
-            compare_selected = initial_variable_col
-            menu_children = spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
-            compare_options = list(prop_categories)
+            compare_selected = model.initial_variable
+            menu_children = model.spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
             output = [
                 menu_children,
-                spec.title,
-                spec.detail.get("question", ""),
+                model.title,
+                model.question,
                 # compare label/options
                 langstrings.get("COMPARE_LABEL"),
-                compare_options,
+                list(model.prop_categories),
                 compare_selected,
                 langstrings.get("FACET_LABEL"),
             ]
@@ -125,8 +131,7 @@ def create_dash(server, url_rule, url_base_pathname):
             output = [no_update] * 7
 
         # facet dropdown depends on category selected  
-        facet_options = {k: k for k in prop_categories if k != compare_selected}
-        facet_options.update({"none": langstrings.get("NONE")})
+        facet_options = model.facet_options.get(compare_selected, {"none": langstrings.get("NONE")})
         if callback_context.triggered_id == "compare_options":  # if the user changed the category then reset the facet
             facet_selected = "none"
         output += [
@@ -134,55 +139,148 @@ def create_dash(server, url_rule, url_base_pathname):
             facet_selected
         ]
 
+        metrics.lap("wrangle")
+
         # activity log
         # TODO find a method for capturing the initial referrer. (the referrer in a callback IS the page itself)
-        core.record_activity(view_name, specification_id, session,
-                             activity={"compare_selected": compare_selected, "facet_selected": facet_selected},
-                             referrer="(callback)", tag=tag)
-
-        # Plot for outcome proportions
-        # wrangle the table according to drop-downs
-        # collapse
-        group_cols = [compare_selected, outcome_col]
-        if facet_selected != "none":
-            group_cols.append(facet_selected)
-        props_data = data.groupby(group_cols).N.apply("sum")
-        # outcome fraction (as %)
-        props_data = props_data.reset_index(level=outcome_col)
-        group_cols.remove(outcome_col)
-        props_data = props_data.groupby(group_cols).apply(lambda x: 100 * sum(x.loc[x[outcome_col] == outcome_numerator, "N"]) / sum(x.N))
-        props_data.name = "outcome_rate"
-        props_data = props_data.reset_index()
-
-        if facet_selected == "none":
-            outcome_figure = px.bar(props_data.sort_values(by=compare_selected),   # sort to get consistent label ordering (may be overridden by category_orders)
-                                    x=compare_selected, y="outcome_rate", category_orders=category_orders)
-        else:
-            outcome_figure = px.bar(props_data.sort_values(by=[compare_selected, facet_selected]),
-                                    x=compare_selected, y="outcome_rate", color=facet_selected, barmode="group", category_orders=category_orders)
-
-        outcome_figure.update_yaxes({"title": outcome_rate_label})
-        outcome_figure.update_layout({"hovermode": "x", "yaxis_ticksuffix": '%', "margin": {"t": 5, "b": 10, "r": 20, "l":50}})
-        outcome_figure.update_traces({"hovertemplate": f"{outcome_rate_label} = %{{y:.2f}}%"})
-        output.append(outcome_figure)
-
-        # Plot for counts
-        group_cols = [compare_selected]
-        if facet_selected != "none":
-            group_cols.append(facet_selected)
-        counts_data = data.groupby(group_cols).N.apply("sum")
-        counts_data.name = "Count"
-        counts_data = counts_data.reset_index()
-        if facet_selected == "none":
-            counts_figure = px.bar(counts_data.sort_values(by=compare_selected),  # sort to get consistent label ordering (may be overridden by category_orders)
-                                   x=compare_selected, y="Count", category_orders=category_orders)
-        else:
-            counts_figure = px.bar(counts_data.sort_values(by=[compare_selected, facet_selected]),
-                                   x=compare_selected, y="Count", color=facet_selected, barmode="group", category_orders=category_orders)
-        counts_figure.update_yaxes({"title": input_count_label})
-        counts_figure.update_layout({"margin": {"t": 15, "r": 20, "l":50}})
-        output.append(counts_figure)
+        record_activity(view_name, specification_id, session,
+                        activity={"compare_selected": compare_selected, "facet_selected": facet_selected},
+                        referrer="(callback)", tag=tag)
+        metrics.lap("record_activity")
+
+        # Plots for outcome proportions and counts
+        output += cached_figures(model, cube, compare_selected, facet_selected)
+        metrics.lap("figure")
 
         return output
 
     return app.server
+
+
+def cached_figures(model, cube, compare_selected, facet_selected):
+    """The outcome rate and count charts, from the figure cache if this view state has been drawn before."""
+    cache_key = (view_name, model.specification_id, compare_selected, facet_selected, model.spec.lang, cube.version)
+    return figure_cache.get(cache_key, lambda: make_figures(cube, compare_selected, facet_selected, model.outcome_rate_label,
+                                                            model.input_count_label, model.category_orders))
+
+
+def prewarm(model):
+    """Populate the caches used by the initial view of a specification. Returns False if the specification is not for this view."""
+    if model.kind != "categorical" or model.initial_variable is None:
+        return False
+    cube = get_cube(model.specification_id, model.spec)
+    if not CLIENTSIDE_RENDER:
+        cached_figures(model, cube, model.initial_variable, "none")
+    return True
+
+
+def make_figures(cube, compare_selected, facet_selected, outcome_rate_label, input_count_label, category_orders):
+    """The outcome rate and count charts for a compare/facet selection."""
+    # Plot for outcome proportions
+    # the cube holds the rates and counts for every compare/facet combination
+    cube_data = cube.lookup(compare_selected, facet_selected)
+    props_data = cube_data.drop(columns="Count")
+
+    if facet_selected == "none":
+        outcome_figure = px.bar(props_data.sort_values(by=compare_selected),   # sort to get consistent label ordering (may be overridden by category_orders)
+                                x=compare_selected, y="outcome_rate", category_orders=category_orders)
+    else:
+        outcome_figure = px.bar(props_data.sort_values(by=[compare_selected, facet_selected]),
+                                x=compare_selected, y="outcome_rate", color=facet_selected, barmode="group", category_orders=category_orders)
+
+    outcome_figure.update_yaxes({"title": outcome_rate_label})
+    outcome_figure.update_layout({"hovermode": "x", "yaxis_ticksuffix": '%', "margin": {"t": 5, "b": 10, "r": 20, "l":50}})
+    outcome_figure.update_traces({"hovertemplate": f"{outcome_rate_label} = %{{y:.2f}}%"})
+
+    # Plot for counts
+    counts_data = cube_data.drop(columns="outcome_rate")
+    if facet_selected == "none":
+        counts_figure = px.bar(counts_data.sort_values(by=compare_selected),  # sort to get consistent label ordering (may be overridden by category_orders)
+                               x=compare_selected, y="Count", category_orders=category_orders)
+    else:
+        counts_figure = px.bar(counts_data.sort_values(by=[compare_selected, facet_selected]),
+                               x=compare_selected, y="Count", color=facet_selected, barmode="group", category_orders=category_orders)
+    counts_figure.update_yaxes({"title": input_count_label})
+    counts_figure.update_layout({"margin": {"t": 15, "r": 20, "l":50}})
+
+    return [outcome_figure, counts_figure]
+
+
+def add_clientside_callbacks(app):
+    """Callbacks for the client-side rendering mode. The server is only called on page load, when it sends the aggregate cube for
+    the specification; drop-down changes are handled in the browser (clientside/explore_categorical.js), which also batches the
+    activity records."""
+    @app.callback(
+        [
+            Output("menu", "children"),
+            Output("heading", "children"),
+            Output("question", "children"),
+            # category selectors
+            Output("compare_label", "children"),
+            Output("compare_options", "options"),
+            Output("compare_options", "value"),  # initial value comes from Specification JSON so this one must be an output.
+            Output("facet_label", "children"),
+            # aggregate data etc for the clientside callback
+            Output("cube_store", "data")
+        ],
+        [
+            Input("location", "pathname"),
+            Input("location", "search")
+        ]
+    )
+    def initial_load(pathname, querystring):
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)
+        metrics.lap("get_specification", specification_id)
+        langstrings = model.langstrings
+
+        cube = get_cube(specification_id, model.spec)
+        metrics.lap("load_data")
+
+        store = cube.to_client()
+        store.update({
+            "labels": {
+                "none": langstrings.get("NONE"),
+                "outcome_rate": model.outcome_rate_label,
+                "input_count": model.input_count_label
+            },
+            "category_orders": model.category_orders,
+            "template": pio.templates[pio.templates.default].to_plotly_json(),  # so that the charts match the plotly express version
+            "beacon_url": beacon_url(view_name, specification_id, tag),
+            "beacon_batch": BEACON_BATCH
+        })
+        metrics.lap("wrangle")
+
+        # activity log for the initial view; later changes are sent in batches from the browser
+        record_activity(view_name, specification_id, session,
+                        activity={"compare_selected": model.initial_variable, "facet_selected": "none"},
+                        referrer="(callback)", tag=tag)
+        metrics.lap("record_activity")
+
+        return [
+            model.spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True),
+            model.title,
+            model.question,
+            # compare label/options
+            langstrings.get("COMPARE_LABEL"),
+            list(model.prop_categories),
+            model.initial_variable,
+            langstrings.get("FACET_LABEL"),
+            store
+        ]
+
+    app.clientside_callback(
+        clientside_function("explore_categorical"),
+        [
+            Output("facet_options", "options"),
+            Output("facet_options", "value"),
+            Output("rates_chart", "figure"),
+            Output("counts_chart", "figure")
+        ],
+        [
+            Input("compare_options", "value"),
+            Input("facet_options", "value"),
+            Input("cube_store", "data")
+        ]
+    )
@@ -1,21 +1,29 @@
 # import logging
 
 from pg_shared.dash_utils import create_dash_app_util
-from simpsons import core, menu, Langstrings
+from simpsons import core, menu
+from SimpsonsFlask.activity import record_activity
+from SimpsonsFlask import metrics
+from SimpsonsData.datasets import load_data
+from SimpsonsFlask.figure_cache import figure_cache
+from SimpsonsFlask.view_models import view_models, parse_location
 from flask import session
 
 from dash import html, dcc, callback_context, no_update
 import plotly.graph_objects as go
 from dash.dependencies import Output, Input  #, State
 
-from sklearn.linear_model import LinearRegression
-
-import numpy as np
-from numpy.random import multivariate_normal
-import pandas as pd
+from SimpsonsData.regression import group_fits
+from SimpsonsData.fits import cached_fits
+from SimpsonsData.sampling import stratified_sample, density_grid
+from SimpsonsData.settings import env_int
 
 view_name = "explore-continuous"  # this is required
 
+# above this many points the chart uses WebGL and shows a sample or a binned density (Specification "large_data_mode") of the data
+MAX_POINTS = env_int("SIMPSONS_SCATTER_MAX_POINTS", 5000)
+DENSITY_BINS = env_int("SIMPSONS_DENSITY_BINS", 60)
+
 def create_dash(server, url_rule, url_base_pathname):
     """Create a Dash view"""
     app = create_dash_app_util(server, url_rule, url_base_pathname)
@@ -77,102 +85,128 @@ def create_dash(server, url_rule, url_base_pathname):
             ]
     )
     def update_chart(pathname, querystring, group_selected):
-        specification_id = pathname.split('/')[-1]
-        tag = None
-        if len(querystring) > 0:
-            for param, value in [pv.split('=') for pv in querystring[1:].split("&")]:
-                if param == "tag":
-                    tag = value
-                    break
-        spec = core.get_specification(specification_id)
-        langstrings = Langstrings(spec.lang)
-
-        # config/data
-        continuous_cols = spec.detail["continuous_cols"]
-        data = spec.load_asset_dataframe("data")
-        group_options = {k: k for k in set(data.columns).difference(set(continuous_cols))}  # the columns which the user can choose to group by.
-        group_options["none"] = langstrings.get("NONE")
-
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)  # column roles, labels and options for the specification
+        metrics.lap("get_specification", specification_id)
+        langstrings = model.langstrings
+
+        # data
+        data, data_version = load_data(specification_id, model.spec)
+        metrics.lap("load_data")
     
         if callback_context.triggered_id == "location":
             # initial load
-            menu_children = spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
+            menu_children = model.spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
             output = [
                 menu_children,
-                spec.title,
-                spec.detail.get("question", ""),
+                model.title,
+                model.question,
                 langstrings.get("GROUP_BY"),
-                group_options
+                model.group_options
             ]
         else:
             output = [no_update] * 5
+        metrics.lap("wrangle")
 
-        def fit(df):
-            lm = LinearRegression(fit_intercept=True)
-            X, y = df[continuous_cols[0]].values.reshape(-1, 1), df[continuous_cols[1]].values
-            lm.fit(X, y)
-            min_x, max_x = min(X)[0], max(X)[0]
-            min_x_y, max_x_y = lm.predict(np.array([min_x, max_x]).reshape(-1, 1))
-            return [min_x, max_x], [min_x_y, max_x_y]
-
-        if group_selected == "none":
-            lm_fit = fit(data)
-            traces = [
-                go.Scatter(
-                    x=data[continuous_cols[0]],
-                    y=data[continuous_cols[1]],
-                    mode="markers",
-                    showlegend=False,
-                    name="",
-                    hovertemplate="%{x:.2f}, %{y:.2f}"
-                ),
-                go.Scatter(
-                    x=lm_fit[0],
-                    y=lm_fit[1],
-                    mode="lines",
-                    name="fit",
-                    line={"color": "black", "dash": "dot"},
-                    showlegend=False
-                )
-            ]
-        else:
-            colours = ["#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A", "#19D3F3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"]
-            traces = []
-            col_ix = 0
-            for cat, cat_data in data.groupby(group_selected):
-                lm_fit = fit(cat_data)
-                traces.append(
-                    go.Scatter(
-                        x=cat_data[continuous_cols[0]],
-                        y=cat_data[continuous_cols[1]],
-                        mode="markers",
-                        marker_color=colours[col_ix],
-                        showlegend=True,
-                        name=cat,
-                        hovertemplate="%{x:.2f}, %{y:.2f}"
-                    )
-                )
-                traces.append(go.Scatter(x=lm_fit[0], y=lm_fit[1], mode = "lines", name=f"fit_{cat}", line={"color": "black", "dash": "dot"}, showlegend=False))
-                col_ix = (col_ix + 1) % len(colours)
-
-        output.append(
-            go.Figure(
-                data=traces,
-                layout=go.Layout(
-                    xaxis={"title": continuous_cols[0]},
-                    yaxis={"title": continuous_cols[1]},
-                    legend={"title": group_selected},
-                    margin={"t": 25, "r": 20, "l":50},
-                    height=600)
-            )
-        )
+        output += cached_figures(model, data, data_version, group_selected)
+        metrics.lap("figure")
 
         # activity log
         # TODO find a method for capturing the initial referrer. (the referrer in a callback IS the page itself)
-        core.record_activity(view_name, specification_id, session,
-                             activity={"group_selected": group_selected},
-                             referrer="(callback)", tag=tag)
+        record_activity(view_name, specification_id, session,
+                        activity={"group_selected": group_selected},
+                        referrer="(callback)", tag=tag)
+        metrics.lap("record_activity")
 
         return output
 
     return app.server
+
+
+def cached_figures(model, data, data_version, group_selected):
+    """The scatter chart, from the figure cache if this view state has been drawn before."""
+    cache_key = (view_name, model.specification_id, group_selected, model.spec.lang, data_version)
+    x_col, y_col = model.continuous_cols
+    group_col = None if group_selected == "none" else group_selected
+    return figure_cache.get(cache_key, lambda: make_figures(data, model.continuous_cols, group_selected, model.langstrings,
+                                                            large_data_mode=model.large_data_mode,
+                                                            fits=cached_fits(model.specification_id, data, data_version, x_col, y_col, group_col)))
+
+
+def prewarm(model):
+    """Populate the caches used by the initial view of a specification. Returns False if the specification is not for this view."""
+    if model.kind != "continuous":
+        return False
+    data, data_version = load_data(model.specification_id, model.spec)
+    cached_figures(model, data, data_version, "none")
+    return True
+
+
+def make_figures(data, continuous_cols, group_selected, langstrings, large_data_mode="sample", fits=None):
+    """The scatter plot with fit line(s), for the selected grouping.
+    Above MAX_POINTS, markers are drawn with WebGL for a stratified sample of the data, or (large_data_mode="density") the points
+    are replaced by binned density contours. Fit lines always use all of the data; fits is as returned by group_fits(), which is
+    called if it is not given."""
+    x_col, y_col = continuous_cols
+    group_col = None if group_selected == "none" else group_selected
+
+    # fit lines for all groups (and the pooled data) in one pass
+    if fits is None:
+        fits = group_fits(data, x_col, y_col, group_col)
+
+    def fit(fit_row):
+        return [fit_row.x_min, fit_row.x_max], [fit_row.y_at_min, fit_row.y_at_max]
+
+    large = len(data) > MAX_POINTS
+    density = large and large_data_mode == "density"
+    plot_data = stratified_sample(data, MAX_POINTS, group_col) if large and not density else data
+    x_range, y_range = (data[x_col].min(), data[x_col].max()), (data[y_col].min(), data[y_col].max())
+
+    def points(df, colour, name, showlegend):
+        if density:
+            x_centres, y_centres, counts = density_grid(df[x_col].values, df[y_col].values, DENSITY_BINS, x_range, y_range)
+            return go.Contour(x=x_centres, y=y_centres, z=counts, contours_coloring="lines", ncontours=8, showscale=False,
+                              colorscale=[[0, colour or "#636EFA"], [1, colour or "#636EFA"]],
+                              name=name, showlegend=showlegend, hovertemplate="%{x:.2f}, %{y:.2f}: %{z}")
+        scatter = go.Scattergl if large else go.Scatter
+        return scatter(x=df[x_col], y=df[y_col], mode="markers", marker_color=colour, showlegend=showlegend, name=name,
+                       hovertemplate="%{x:.2f}, %{y:.2f}")
+
+    if group_col is None:
+        lm_fit = fit(fits.iloc[-1])
+        traces = [
+            points(plot_data, None, "", False),
+            go.Scatter(
+                x=lm_fit[0],
+                y=lm_fit[1],
+                mode="lines",
+                name="fit",
+                line={"color": "black", "dash": "dot"},
+                showlegend=False
+            )
+        ]
+    else:
+        colours = ["#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A", "#19D3F3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"]
+        traces = []
+        col_ix = 0
+        for cat, cat_data in plot_data.groupby(group_col, observed=True):
+            lm_fit = fit(fits.loc[cat])
+            traces.append(points(cat_data, colours[col_ix], cat, True))
+            traces.append(go.Scatter(x=lm_fit[0], y=lm_fit[1], mode = "lines", name=f"fit_{cat}", line={"color": "black", "dash": "dot"}, showlegend=False))
+            col_ix = (col_ix + 1) % len(colours)
+
+    figure = go.Figure(
+        data=traces,
+        layout=go.Layout(
+            xaxis={"title": continuous_cols[0]},
+            yaxis={"title": continuous_cols[1]},
+            legend={"title": group_selected},
+            margin={"t": 25, "r": 20, "l":50},
+            height=600)
+    )
+    if large:
+        note = langstrings.get("DENSITY_NOTE" if density else "SAMPLE_NOTE").format(shown=len(plot_data), total=len(data))
+        figure.add_annotation(text=note, xref="paper", yref="paper", x=1, y=1, xanchor="right", yanchor="bottom", showarrow=False)
+
+    return [figure]
@@ -1,15 +1,35 @@
+import json
 import logging
 
 from pg_shared.dash_utils import create_dash_app_util
-from simpsons import core, menu, Langstrings
+from simpsons import core, menu
+from SimpsonsFlask.activity import record_activity
+from SimpsonsFlask import metrics
+from SimpsonsData.simulate import validate_params, simulated_rates, monte_carlo, sweep, sweep_parameters
+from SimpsonsData.settings import env_flag, env_int
+from SimpsonsFlask.dash_apps.clientside import beacon_url, clientside_function
+from SimpsonsFlask.view_models import view_models, parse_location
 from flask import abort, session
+import numpy as np
 import pandas as pd
 from dash import html, dcc, callback_context, no_update
 import plotly.express as px
-from dash.dependencies import Output, Input, State
+import plotly.io as pio
+import plotly.graph_objects as go
+from dash.dependencies import Output, Input, State, ALL
 
 view_name = "simulate-categorical"  # this is required
 
+# number of simulated populations for the "random variation" (Monte Carlo) option and the interval shown
+MC_REPLICATES = env_int("SIMPSONS_MC_REPLICATES", 10000)
+MC_INTERVAL = 95
+# number of values (from 0 to 100%) along each axis of a parameter sweep
+SWEEP_RESOLUTION = env_int("SIMPSONS_SWEEP_RESOLUTION", 101)
+# Opt-in: work out the (expected) rate chart in the browser, re-drawing it as the inputs change; see clientside/simulate_live.js
+CLIENTSIDE_SIMULATE = env_flag("SIMPSONS_CLIENTSIDE_SIMULATE")
+LIVE_DEBOUNCE_MS = env_int("SIMPSONS_LIVE_DEBOUNCE_MS", 150)
+BEACON_BATCH = env_int("SIMPSONS_BEACON_BATCH", 10)
+
 def create_dash(server, url_rule, url_base_pathname):
     """Create a Dash view"""
     app = create_dash_app_util(server, url_rule, url_base_pathname)
@@ -31,6 +51,10 @@ def create_dash(server, url_rule, url_base_pathname):
 
         # Input controls are generated on 1st load as they are determined by config.
         html.Div([], id="sim_params"),
+        # ... and their values are collected into a structured store for the simulation (see SimpsonsData.simulate)
+        dcc.Store(id="sim_state"),
+        # labels etc for the live (clientside) rate chart, when CLIENTSIDE_SIMULATE
+        dcc.Store(id="sim_config"),
 
         html.Div(
             [
@@ -44,6 +68,22 @@ def create_dash(server, url_rule, url_base_pathname):
                 html.Div(dcc.Checklist(id="sim_options"), className="col-md-2"),
                 html.Div(dcc.Loading(dcc.Graph(id="rates_chart", config={'displayModeBar': False}), type="circle"), className="col-md-10")
             ], className="row"
+        ),
+
+        # Parameter sweep: where over the range of one or two parameters does the paradox appear? Options are generated on 1st load.
+        html.Div(
+            [
+                html.Div(
+                    [
+                        html.Label("", id="sweep_label"),
+                        dcc.Dropdown(id="sweep_x", searchable=False, clearable=False),
+                        dcc.Dropdown(value="none", id="sweep_y", searchable=False, clearable=False, style={"margin-top": "10px"}),
+                        html.Button("", id="sweep_button", style={"margin-top": "10px"}),
+                        html.Strong(id="sweep_error")
+                    ], className="col-md-2"
+                ),
+                html.Div(dcc.Loading(dcc.Graph(id="sweep_chart", config={'displayModeBar': False}), type="circle"), className="col-md-10")
+            ], className="row"
         )
 
     ],
@@ -57,50 +97,38 @@ def create_dash(server, url_rule, url_base_pathname):
             Output("heading", "children"),
             Output("sim_params", "children"),
             Output("sim_button", "children"),
-            Output("sim_options", "options")
-        ],
+            Output("sim_options", "options"),
+            # sweep controls
+            Output("sweep_label", "children"),
+            Output("sweep_x", "options"),
+            Output("sweep_x", "value"),
+            Output("sweep_y", "options"),
+            Output("sweep_button", "children")
+        ] + ([Output("sim_config", "data")] if CLIENTSIDE_SIMULATE else []),
         [
             Input("location", "pathname"),
             Input("location", "search")
         ]
     )
     def add_sim_inputs(pathname, querystring):
-        specification_id = pathname.split('/')[-1]
-        tag = None
-        if len(querystring) > 0:
-            for param, value in [pv.split('=') for pv in querystring[1:].split("&")]:
-                if param == "tag":
-                    tag = value
-                    break
-        spec = core.get_specification(specification_id)
-        langstrings = Langstrings(spec.lang)
-
-        menu_children = spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
-
-        if "simulate_categories" not in spec.detail:
-            return [menu_children, "Error: 'simulate_categories' missing from config", None, None, None]
-
-        # the category table and configured column usage
-        outcome_col = spec.detail["outcome"]
-        sim_cols = spec.detail["simulate_categories"]
-        outcome_numerator = spec.detail["outcome_numerator"]
-        outcome_rate_label = spec.detail["outcome_rate_label"]
-        input_count_label = spec.detail.get("input_count_label", langstrings.get("COUNT"))
-        data = spec.load_asset_dataframe("data")
-    
-        col1_sums = data.groupby(sim_cols[0]).N.sum()
-        col2_values = list(data[sim_cols[1]].unique())
-        col2_values.sort()
-        col2_pc_category = col2_values[0]
-        col2_pc = pd.pivot_table(data, values="N", index=sim_cols[0], columns=sim_cols[1]).apply(lambda x: int(100 * x[col2_pc_category] / sum(x)), axis=1)
-        if len(col2_values) != 2:
-            return [menu_children, "Error: 'simulate_categories' is mis-specified", None, None, None]
-        base_pc = pd.pivot_table(data, values="N", index=sim_cols, columns=outcome_col).apply(lambda x: 100 * x[outcome_numerator] / sum(x), axis=1)
-        # generally round the percentages to integers but some situations may have very small values
-        if base_pc.median() > 20:
-            base_pc = base_pc.round(0).astype(int)
-        else:
-            base_pc = base_pc.round(2)
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)  # column roles, labels and simulator starting parameters for the specification
+        metrics.lap("get_specification", specification_id)
+        langstrings = model.langstrings
+
+        menu_children = model.spec.make_menu(menu, langstrings, core.plaything_root, view_name, query_string=querystring, for_dash=True)
+
+        if model.sim_error is not None:
+            return [menu_children, model.sim_error] + [None] * (9 if CLIENTSIDE_SIMULATE else 8)
+
+        # configured column usage and the starting parameters from the category table
+        sim_cols = model.sim_cols
+        outcome_rate_label = model.outcome_rate_label
+        input_count_label = model.input_count_label
+        params = model.sim_params
+        col2_pc_category = params["col2_category"]
+        col2_values = list(params["base_rates"][next(iter(params["counts"]))])
 
         # I initially tried using Bootstrap grid layout but React.js had problems on the client side. Might be my mis-use but still... now using tables
         # heading - col widths should match the parameter input structure
@@ -114,16 +142,16 @@ def create_dash(server, url_rule, url_base_pathname):
             ]
         )
 
-        # !! text input types will need validating as numbers in simulation
-        # one row for each value of col1
+        # text input types are validated as numbers in simulation
+        # one row for each value of col1. The ids are pattern-matched to collect the values into sim_state
         sim_params_rows = []
-        for cat1, cnt1 in col1_sums.items():
+        for cat1, cnt1 in params["counts"].items():
             cells = [
                 html.Th(cat1),
-                html.Td(dcc.Input(type="text", value=cnt1, size=5, id="c1_" + cat1.replace(" ", "_"))),  # count for col1 category
-                html.Td(dcc.Input(type="range", value=col2_pc.loc[cat1], min=1, max=100, id=f"c2_{cat1.replace(' ', '_')}~{col2_pc_category}")),  # col2 proportion slider
+                html.Td(dcc.Input(type="text", value=cnt1, size=5, id={"type": "c1", "cat1": cat1})),  # count for col1 category
+                html.Td(dcc.Input(type="range", value=params["col2_pc"][cat1], min=1, max=100, id={"type": "c2", "cat1": cat1, "cat2": col2_pc_category})),  # col2 proportion slider
                 # category pair base rates
-                html.Td([dcc.Input(type="text", value=base_pc.loc[(cat1, cat2)], size=6, id=f"br_{cat1.replace(' ', '_')}~{cat2.replace(' ', '_')}") for cat2 in col2_values])
+                html.Td([dcc.Input(type="text", value=params["base_rates"][cat1][cat2], size=6, id={"type": "br", "cat1": cat1, "cat2": cat2}) for cat2 in col2_values])
             ]
             sim_params_rows.append(html.Tr(cells))
         
@@ -134,117 +162,238 @@ def create_dash(server, url_rule, url_base_pathname):
 
         output = [
             menu_children,
-            spec.title,
+            model.title,
             sim_params,
             langstrings.get("SIMULATE"),
-            {"facet": langstrings.get("FACET_LABEL")}  # sim options
+            {"facet": langstrings.get("FACET_LABEL"), "stochastic": langstrings.get("MONTE_CARLO")}  # sim options
         ]
 
+        # sweep options: the slider percentages and base rates. Values are the JSON of the SimpsonsData.simulate.sweep_parameters() entry
+        sweep_options = {json.dumps(axis): sweep_axis_label(axis, sim_cols, col2_pc_category, outcome_rate_label) for axis in sweep_parameters(params)}
+        output += [
+            langstrings.get("SWEEP_LABEL"),
+            sweep_options,
+            next(iter(sweep_options)),
+            {"none": langstrings.get("NONE"), **sweep_options},
+            langstrings.get("SWEEP")
+        ]
+        if CLIENTSIDE_SIMULATE:
+            output.append({
+                "labels": {"outcome_rate": outcome_rate_label},
+                "sim_cols": sim_cols,
+                "category_orders": model.category_orders,
+                "template": pio.templates[pio.templates.default].to_plotly_json(),  # so that the chart matches the plotly express version
+                "beacon_url": beacon_url(view_name, specification_id, tag),
+                "beacon_batch": BEACON_BATCH,
+                "debounce_ms": LIVE_DEBOUNCE_MS
+            })
+        metrics.lap("wrangle")
+
         return output
 
+    # with CLIENTSIDE_SIMULATE, this only draws the "random variation" chart; the clientside callback below draws the others
     @app.callback(
         [
-            Output("rates_chart", "figure"),
-            Output("sim_error", "children")
+            Output("rates_chart", "figure", allow_duplicate=CLIENTSIDE_SIMULATE),
+            Output("sim_error", "children", allow_duplicate=CLIENTSIDE_SIMULATE)
         ],
         [
             Input("location", "pathname"),
             Input("location", "search"),
-            State("sim_params", "children"),
+            State("sim_state", "data"),
             Input("sim_options", "value"),
             Input("sim_button", "n_clicks")
         ],
         prevent_initial_call = True
     )
-    def update_chart(pathname, querystring, sim_params, sim_options, n_clicks):
-        specification_id = pathname.split('/')[-1]
-        tag = None
-        if len(querystring) > 0:
-            for param, value in [pv.split('=') for pv in querystring[1:].split("&")]:
-                if param == "tag":
-                    tag = value
-                    break
-        spec = core.get_specification(specification_id)
-        # langstrings = Langstrings(spec.lang)
-    
-        # the category table and configured column usage
-        outcome_col = spec.detail["outcome"]
-        outcome_numerator = spec.detail["outcome_numerator"]
-        outcome_rate_label = spec.detail["outcome_rate_label"]
-        initial_variable_col = spec.detail["initial_variable"]
-        category_orders = spec.detail.get("category_orders", None)
-        sim_cols = spec.detail.get("simulate_categories", None)
-
-        if len([] if sim_params is None else sim_params) == 0:
+    def update_chart(pathname, querystring, sim_state, sim_options, n_clicks):
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)  # column roles, labels and simulator starting parameters for the specification
+        metrics.lap("get_specification", specification_id)
+
+        facet = "facet" in ([] if sim_options is None else sim_options)
+        stochastic = "stochastic" in ([] if sim_options is None else sim_options)
+        if CLIENTSIDE_SIMULATE and not stochastic:
+            return no_update, no_update
+
+        if sim_state is None:
             # pre-sim, show blank bar chart with correct axis labels
-            dummy_fig = px.bar(pd.DataFrame(columns=[initial_variable_col, "outcome_rate"]), x=initial_variable_col, y="outcome_rate")
-            dummy_fig.update_yaxes({"title": outcome_rate_label})
+            dummy_fig = px.bar(pd.DataFrame(columns=[model.initial_variable, "outcome_rate"]), x=model.initial_variable, y="outcome_rate")
+            dummy_fig.update_yaxes({"title": model.outcome_rate_label})
             return dummy_fig, ""
 
-        facet = "facet" in ([] if sim_options is None else sim_options)
+        # the simulation parameters are collected from the inputs into sim_state by a clientside callback. Check they are numbers in range
+        params, errors = validate_params(sim_state)
+        has_error = None
+        if len(errors) > 0:
+            has_error = "Sim parameter error: " + "; ".join(f"{field} {message}" for field, message in errors.items())
+            logging.warning(has_error)
+        metrics.lap("validate")
+
+        # activity log
+        record_activity(view_name, specification_id, session,
+                        activity={"has_error": has_error, "stochastic": stochastic},  # TODO add some info? All of the params?
+                        referrer="(callback)", tag=tag)
+        metrics.lap("record_activity")
 
-        # extract the simulation parameters from the HTML mess! This ABSOLUTELY depends on the structure, although the ids etc would allow a semantic extraction
-        has_error = None  # TODO add check numeric and range -  add some text next to button to give warning when input data is invalid (give cat 1 value)
-        data_d = []
-        for row in sim_params["props"]["children"][1]["props"]["children"]:  # [1] picks out <tbody>
-            try:
-                cells = row["props"]["children"]
-                cat1 = cells[0]["props"]["children"]
-                cat1_cnt = float(cells[1]["props"]["children"]["props"]["value"])
-                cat2_pc = float(cells[2]["props"]["children"]["props"]["value"])
-                col2_pc_category = cells[2]["props"]["children"]["props"]["id"].split("~")[1]  # extract of category for col2 ensures no accidental category transposition
-                base_rates = {ri["props"]["id"].split("~")[1]: float(ri["props"]["value"])  for ri in cells[3]["props"]["children"]}
-                # list of dicts with keys matching the CSV headers in the source data
-                for cat2, base_rate in base_rates.items():
-                    cat2_prop = 0.01 * (cat2_pc if cat2 == col2_pc_category else (100 - cat2_pc))
-                    # outcome = outcome_numerator
-                    data_d.append({
-                        sim_cols[0]: cat1,
-                        sim_cols[1]: cat2,
-                        outcome_col: outcome_numerator,
-                        "N": cat1_cnt * cat2_prop * 0.01 * base_rate
-                    })
-                    # outcome = not
-                    data_d.append({
-                        sim_cols[0]: cat1,
-                        sim_cols[1]: cat2,
-                        outcome_col: "not",
-                        "N": cat1_cnt * cat2_prop * 0.01 * (100 - base_rate)
-                    })
-            except Exception as ex:
-                # we will assume this is normally a parameter entry issue but log anyway
-                has_error = f"Sim parameter error for: {cat1}."
-                logging.warn(f"{has_error}\n{ex}")
-        
         # EXIT IF ERROR
         if has_error is not None:
             return no_update, has_error
 
-        data = pd.DataFrame(data_d)
+        outcome_figure = rates_figure(model, params, facet, stochastic)
+        metrics.lap("figure")
+
+        return outcome_figure, ""
+
+    @app.callback(
+        [
+            Output("sweep_chart", "figure"),
+            Output("sweep_error", "children")
+        ],
+        [
+            Input("location", "pathname"),
+            Input("location", "search"),
+            State("sim_state", "data"),
+            State("sweep_x", "value"),
+            State("sweep_y", "value"),
+            Input("sweep_button", "n_clicks")
+        ],
+        prevent_initial_call = True
+    )
+    def update_sweep(pathname, querystring, sim_state, sweep_x, sweep_y, n_clicks):
+        specification_id, tag = parse_location(pathname, querystring)
+        metrics.lap("dispatch", specification_id, found=False)
+        model = view_models.get(specification_id)  # column roles, labels and simulator starting parameters for the specification
+        metrics.lap("get_specification", specification_id)
+
+        if n_clicks is None or sim_state is None or sweep_x is None:
+            return no_update, ""
 
-        if not facet:
-            data = data.groupby([sim_cols[1], outcome_col]).N.apply("sum")
-            plot_data = pd.pivot_table(data.reset_index(), values="N", index=sim_cols[1], columns=outcome_col).apply(lambda x: 100 * x[outcome_numerator] / sum(x), axis=1)
-            plot_data.name = "outcome_rate"  # Series
-            outcome_figure = px.bar(plot_data.reset_index().sort_values(by=sim_cols[1]),   # sort to get consistent label ordering (may be overridden by category_orders)
-                                x=sim_cols[1], y="outcome_rate", category_orders=category_orders)
-        else:
-            plot_data = pd.pivot_table(data, values="N", index=sim_cols, columns=outcome_col).apply(lambda x: 100 * x[outcome_numerator] / sum(x), axis=1)
-            plot_data.name = "outcome_rate"  # Series
-            outcome_figure = px.bar(plot_data.reset_index().sort_values(by=[sim_cols[1], sim_cols[0]]),   # sort to get consistent label ordering (may be overridden by category_orders)
-                                x=sim_cols[1], y="outcome_rate", color=sim_cols[0], barmode="group", category_orders=category_orders)
+        params, errors = validate_params(sim_state)
+        if len(errors) > 0:
+            return no_update, "Sim parameter error: " + "; ".join(f"{field} {message}" for field, message in errors.items())
+        axes = [tuple(json.loads(sweep_x))]
+        if sweep_y not in (None, "none") and sweep_y != sweep_x:
+            axes.append(tuple(json.loads(sweep_y)))
+        metrics.lap("validate")
 
-        outcome_figure.update_yaxes({"title": outcome_rate_label})
-        outcome_figure.update_layout({"hovermode": "x", "yaxis_ticksuffix": '%', "margin": {"t": 5, "r": 20, "l":50}})
-        outcome_figure.update_traces({"hovertemplate": f"{outcome_rate_label} = %{{y:.2f}}%"})
+        record_activity(view_name, specification_id, session,
+                        activity={"sweep": [list(axis) for axis in axes]},
+                        referrer="(callback)", tag=tag)
+        metrics.lap("record_activity")
 
-        # activity log
-        core.record_activity(view_name, specification_id, session,
-                             activity={"has_error": has_error},  # TODO add some info? All of the params?
-                             referrer="(callback)", tag=tag)
+        figure = sweep_figure(model, params, axes)
+        metrics.lap("figure")
 
+        return figure, ""
 
+    # collect the values of the simulation inputs into sim_state, keyed by category, so that only this travels to the server
+    app.clientside_callback(
+        clientside_function("simulate_state"),
+        Output("sim_state", "data"),
+        [
+            Input({"type": "c1", "cat1": ALL}, "value"),
+            Input({"type": "c2", "cat1": ALL, "cat2": ALL}, "value"),
+            Input({"type": "br", "cat1": ALL, "cat2": ALL}, "value")
+        ]
+    )
 
-        return outcome_figure, ""
+    if CLIENTSIDE_SIMULATE:
+        # the rate chart is re-drawn in the browser as sim_state changes; activity records are sent in batches to the beacon route
+        app.clientside_callback(
+            clientside_function("simulate_live"),
+            [
+                Output("rates_chart", "figure"),
+                Output("sim_error", "children")
+            ],
+            [
+                Input("sim_state", "data"),
+                Input("sim_options", "value"),
+                Input("sim_config", "data")
+            ]
+        )
 
     return app.server
+
+
+def rates_figure(model, params, facet, stochastic, seed=None):
+    """The outcome rate chart for validated simulation parameters and the chosen options. seed is for the "random variation" option."""
+    outcome_rate_label = model.outcome_rate_label
+    category_orders = model.category_orders
+    sim_cols = model.sim_cols
+
+    if stochastic:
+        # mean outcome rates over many random populations, with error bars for the interval
+        mc = monte_carlo(params, sim_cols, replicates=MC_REPLICATES, level=MC_INTERVAL, seed=seed)
+        plot_data = mc["facets" if facet else "aggregate"]
+        plot_data["error_plus"] = plot_data.upper - plot_data.outcome_rate
+        plot_data["error_minus"] = plot_data.outcome_rate - plot_data.lower
+        error_bars = {"error_y": "error_plus", "error_y_minus": "error_minus"}
+    else:
+        plot_data = simulated_rates(params, sim_cols, model.outcome_col, model.outcome_numerator, facet=facet)  # Series
+        error_bars = {}
+    metrics.lap("simulate")
+    if not facet:
+        outcome_figure = px.bar(plot_data.reset_index().sort_values(by=sim_cols[1]),   # sort to get consistent label ordering (may be overridden by category_orders)
+                                x=sim_cols[1], y="outcome_rate", category_orders=category_orders, **error_bars)
+    else:
+        outcome_figure = px.bar(plot_data.reset_index().sort_values(by=[sim_cols[1], sim_cols[0]]),   # sort to get consistent label ordering (may be overridden by category_orders)
+                                x=sim_cols[1], y="outcome_rate", color=sim_cols[0], barmode="group", category_orders=category_orders, **error_bars)
+
+    outcome_figure.update_yaxes({"title": outcome_rate_label})
+    outcome_figure.update_layout({"hovermode": "x", "yaxis_ticksuffix": '%', "margin": {"t": 30 if stochastic else 5, "r": 20, "l":50}})
+    outcome_figure.update_traces({"hovertemplate": f"{outcome_rate_label} = %{{y:.2f}}%"})
+    if stochastic:
+        note = model.langstrings.get("REVERSAL_NOTE").format(pc=100 * mc["reversal_fraction"], n=MC_REPLICATES, level=MC_INTERVAL)
+        outcome_figure.add_annotation(text=note, xref="paper", yref="paper", x=0, y=1, xanchor="left", yanchor="bottom", showarrow=False)
+    return outcome_figure
+
+
+def sweep_figure(model, params, axes):
+    """The parameter sweep chart for validated simulation parameters, over one or two entries from sweep_parameters()."""
+    outcome_rate_label = model.outcome_rate_label
+    sim_cols = model.sim_cols
+    langstrings = model.langstrings
+
+    result = sweep(params, axes, resolution=SWEEP_RESOLUTION)
+    metrics.lap("simulate")
+    col2_values = result["col2_values"]
+    axis_labels = [sweep_axis_label(axis, sim_cols, params["col2_category"], outcome_rate_label) for axis in axes]
+    region_label = langstrings.get("PARADOX_REGION")
+    if len(axes) == 1:
+        # aggregate rates for each col2 value, with the paradox region shaded
+        x = result["values"][0]
+        traces = [go.Scatter(x=x, y=result["aggregate_rates"][:, i], mode="lines", name=str(col2_values[i]),
+                             hovertemplate=f"{outcome_rate_label} = %{{y:.2f}}%") for i in range(2)]
+        traces.append(go.Scatter(x=x, y=np.where(result["reversal"], np.nanmax(result["aggregate_rates"]), np.nan), mode="none",
+                                 fill="tozeroy", fillcolor="rgba(0, 0, 0, 0.15)", name=region_label, hoverinfo="skip"))
+        layout = {"yaxis": {"title": outcome_rate_label, "ticksuffix": "%"}, "legend": {"title": sim_cols[1]}}
+    else:
+        # difference in aggregate rates, with the paradox region outlined
+        x, y = result["values"]
+        difference = (result["aggregate_rates"][..., 0] - result["aggregate_rates"][..., 1]).astype(np.float32)  # keeps the payload small
+        traces = [
+            go.Heatmap(x=x, y=y, z=difference, colorscale="RdBu", zmid=0,
+                       colorbar={"title": f"{col2_values[0]} - {col2_values[1]}"},
+                       hovertemplate="%{x:.0f}%, %{y:.0f}%: %{z:.2f}<extra></extra>"),
+            go.Contour(x=x, y=y, z=result["reversal"].astype(np.int8), contours={"start": 0.5, "end": 0.5, "size": 1, "coloring": "lines"},
+                       line={"width": 3}, colorscale=[[0, "black"], [1, "black"]], showscale=False, name=region_label,
+                       showlegend=True, hoverinfo="skip")
+        ]
+        layout = {"yaxis": {"title": axis_labels[1], "ticksuffix": "%"}, "legend": {"orientation": "h", "y": 1.02, "yanchor": "bottom"}}
+    return go.Figure(data=traces, layout={"xaxis": {"title": axis_labels[0], "ticksuffix": "%"},
+                                          "margin": {"t": 25, "r": 20, "l": 50}, **layout})
+
+
+def sweep_axis_label(axis, sim_cols, col2_category, outcome_rate_label):
+    """Human-readable label for an entry from SimpsonsData.simulate.sweep_parameters()"""
+    if axis[0] == "col2_pc":
+        return f"{sim_cols[1]}: % {col2_category} ({axis[1]})"
+    return f"{outcome_rate_label}: {axis[1]}, {axis[2]}"
+
+
+def prewarm(model):
+    """Populate the caches used by the initial view of a specification. Returns False if the specification is not for this view.
+    The starting parameters are worked out when the view model is built, so there is nothing more to do here."""
+    return model.kind == "categorical" and model.sim_cols is not None
@@ -0,0 +1,226 @@
+"""Export every chart the views can draw for each enabled specification, as static JSON and/or HTML, e.g. for lectures or a read-only
+mirror. Run from the repository root: python -m SimpsonsFlask.export --out DIR [--workers N] [--formats json html] [specification_id ...]
+The charts are made by the same code as the Dash callbacks, for every view state:
+  explore-categorical: each compare category with each facet (including none)
+  explore-continuous: each grouping (including none)
+  simulate-categorical: the starting parameters with each combination of options, and a sweep of each parameter on its own
+    (add --sweep-pairs for the sweeps of every pair of parameters). "Random variation" uses a fixed seed, so re-exports match.
+Files are written to DIR/{view}/{specification_id}/{state}.json (the figures, as Plotly JSON) and .html (a page which loads
+DIR/plotly.min.js), and DIR/index.json lists the states exported for each view and specification. An interrupted export can be
+resumed by running it again: states whose files exist are skipped, unless the specification or its data has changed since they
+were written (or --force is given).
+"""
+import argparse
+import hashlib
+import html
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations, product
+
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs
+
+from simpsons import core, specification_items
+from SimpsonsData.cube import get_cube
+from SimpsonsData.datasets import load_data
+from SimpsonsData.simulate import sweep_parameters, validate_params
+from SimpsonsFlask.dash_apps import dash_explore_categorical, dash_explore_continuous, dash_simulate_categorical
+from SimpsonsFlask.view_models import view_models
+
+FORMATS = ("json", "html")
+MC_SEED = 0
+
+
+def view_states(model, sweep_pairs=False):
+    """(view_name, state) for every chart of every view which can show the specification. States are JSON-compatible dicts."""
+    if model.kind == "continuous":
+        return [(dash_explore_continuous.view_name, {"group": group}) for group in model.group_options]
+
+    states = [(dash_explore_categorical.view_name, {"compare": compare, "facet": facet})
+              for compare in model.prop_categories for facet in model.facet_options[compare]]
+    if model.sim_error is None:
+        view_name = dash_simulate_categorical.view_name
+        states += [(view_name, {"facet": facet, "stochastic": stochastic}) for facet, stochastic in product([False, True], repeat=2)]
+        axes = [list(axis) for axis in sweep_parameters(model.sim_params)]
+        states += [(view_name, {"sweep": [axis]}) for axis in axes]
+        if sweep_pairs:
+            states += [(view_name, {"sweep": list(pair)}) for pair in combinations(axes, 2)]
+    return states
+
+
+def state_name(state: dict) -> str:
+    """A file name for a view state. Values which are not safe in file names are replaced, with a hash to keep names distinct."""
+    parts = []
+    for key, value in state.items():
+        if isinstance(value, bool):
+            if value:
+                parts.append(key)
+        elif key == "sweep":
+            parts += [key] + ["-".join(map(str, axis)) for axis in value]
+        else:
+            parts.append(f"{key}-{value}")
+    name = "--".join(parts) if parts else "default"
+    safe = re.sub(r"[^\w.-]+", "_", name)
+    if safe != name:
+        safe += "-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return safe
+
+
+def make_figures(model, view_name, state):
+    """The figures for a view state, as drawn by the view's callback."""
+    if view_name == dash_explore_categorical.view_name:
+        cube = get_cube(model.specification_id, model.spec)
+        return dash_explore_categorical.cached_figures(model, cube, state["compare"], state["facet"])
+    if view_name == dash_explore_continuous.view_name:
+        data, data_version = load_data(model.specification_id, model.spec)
+        return dash_explore_continuous.cached_figures(model, data, data_version, state["group"])
+
+    params, errors = validate_params(model.sim_params)
+    if len(errors) > 0:
+        raise ValueError(f"Starting parameters are not valid: {errors}")
+    if "sweep" in state:
+        return [dash_simulate_categorical.sweep_figure(model, params, [tuple(axis) for axis in state["sweep"]])]
+    return [dash_simulate_categorical.rates_figure(model, params, state["facet"], state["stochastic"], seed=MC_SEED)]
+
+
+def _write(path: str, text: str):
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)  # so that an interrupted export never leaves a partial file to be skipped on resume
+
+
+def _html(title: str, figures) -> str:
+    divs = "\n".join(pio.to_html(figure, full_html=False, include_plotlyjs=False) for figure in figures)
+    return (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{html.escape(title)}</title>\n'
+            f'<script src="../../plotly.min.js"></script>\n</head>\n<body>\n{divs}\n</body>\n</html>\n')
+
+
+def export_state(out_dir, view_name, specification_id, name, state, formats):
+    """Make and write the files for one view state. Runs in a worker process. Returns the seconds taken."""
+    t0 = time.perf_counter()
+    model = view_models.get(specification_id)
+    figures = make_figures(model, view_name, state)
+    path = os.path.join(out_dir, view_name, specification_id, name)
+    if "json" in formats:
+        _write(f"{path}.json", to_json_plotly({"view": view_name, "specification_id": specification_id, "state": state,
+                                               "figures": figures}))
+    if "html" in formats:
+        _write(f"{path}.html", _html(f"{model.title} - {view_name} - {name}", figures))
+    return time.perf_counter() - t0
+
+
+def export_batch(out_dir, batch, formats):
+    """export_state() for each (view_name, specification_id, name, state) of a batch, all of one specification, so that the worker
+    loads its data once. Runs in a worker process. Returns (seconds, None) or (None, error) for each state of the batch."""
+    results = []
+    for view_name, specification_id, name, state in batch:
+        try:
+            results.append((export_state(out_dir, view_name, specification_id, name, state, formats), None))
+        except Exception as ex:
+            results.append((None, repr(ex)))
+    return results
+
+
+def batches(todo, size):
+    """The states to export, in lists of at most size states of a single specification."""
+    by_specification = {}
+    for item in todo:
+        by_specification.setdefault(item[1], []).append(item)
+    return [items[i:i + size] for items in by_specification.values() for i in range(0, len(items), size)]
+
+
+def plan(out_dir, specification_ids, formats, sweep_pairs=False, force=False):
+    """The index of every view state for the specifications, the number of states for these specifications and the
+    (view_name, specification_id, name, state) still to export.
+    Output for a view and specification exported from an earlier version of the specification or its data is deleted."""
+    index_path = os.path.join(out_dir, "index.json")
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {}
+    todo = []
+    failed = {}
+    planned = 0
+    for specification_id, _ in specification_items(core.get_specifications()):
+        if specification_ids and specification_id not in specification_ids:
+            continue
+        try:
+            model = view_models.get(specification_id)
+            states = view_states(model, sweep_pairs=sweep_pairs)
+        except Exception as ex:  # a broken specification should not stop the others being exported
+            failed[specification_id] = repr(ex)
+            continue
+        version = f"{model.spec_version}-{model.data_version}"
+        by_view = {}
+        for view_name, state in states:
+            by_view.setdefault(view_name, {})[state_name(state)] = state
+        for view_name, named in by_view.items():
+            directory = os.path.join(out_dir, view_name, specification_id)
+            previous = index.get(view_name, {}).get(specification_id, {})
+            if (force or previous.get("version") != version) and os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.makedirs(directory, exist_ok=True)
+            index.setdefault(view_name, {})[specification_id] = {"version": version, "title": model.title, "states": named}
+            planned += len(named)
+            for name, state in named.items():
+                if not all(os.path.exists(os.path.join(directory, f"{name}.{fmt}")) for fmt in formats):
+                    todo.append((view_name, specification_id, name, state))
+    _write(index_path, json.dumps(index, indent=1))
+    return index, planned, todo, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("specification_ids", nargs="*")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes (default: the number of CPUs)")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--sweep-pairs", action="store_true", help="also export the two-parameter sweeps of the simulation")
+    parser.add_argument("--force", action="store_true", help="export every state again, even if its files exist")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    index, total, todo, failed = plan(args.out, args.specification_ids, args.formats, sweep_pairs=args.sweep_pairs, force=args.force)
+    for specification_id, error in failed.items():
+        print(f"{specification_id}: FAILED {error}")
+    print(f"{total - len(todo)} of {total} view states already exported; exporting {len(todo)} with {args.workers} workers")
+    if "html" in args.formats and not os.path.exists(os.path.join(args.out, "plotly.min.js")):
+        _write(os.path.join(args.out, "plotly.min.js"), get_plotlyjs())
+
+    exported = 0
+    done = 0
+    # each task is a batch of the states of one specification, so a specification's data is loaded by as few workers as possible;
+    # a specification with more states than a fair share per worker is split so that all of the workers are kept busy
+    size = max(1, math.ceil(len(todo) / args.workers))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(export_batch, args.out, batch, args.formats): batch for batch in batches(todo, size)}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as ex:  # e.g. the worker process was killed
+                results = [(None, repr(ex))] * len(batch)
+            for (view_name, specification_id, name, _), (seconds, error) in zip(batch, results):
+                done += 1
+                key = f"{view_name}/{specification_id}/{name}"
+                if error is None:
+                    exported += 1
+                    print(f"[{done}/{len(todo)}] {key} {seconds:.2f}s")
+                else:
+                    failed[key] = error
+                    print(f"[{done}/{len(todo)}] {key} FAILED {error}")
+    print(f"Exported {exported} view states in {time.perf_counter() - t0:.1f}s ({len(failed)} failed)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+from SimpsonsData.settings import env_int
+from SimpsonsFlask import metrics
+
+# Bounded LRU cache of rendered Plotly figures, shared by the Dash views.
+# The figures for a view are fully determined by the specification, the selections made by the user, the language and the
+# version of the data asset, so callers use a tuple of these as the key. Figures are held as their serialised JSON, which is
+# what we measure against the byte limit; on a hit this is decoded to plain dicts which Dash passes through its JSON encoder
+# without the Plotly figure construction and validation.
+MAX_ENTRIES = env_int("SIMPSONS_FIGURE_CACHE_ENTRIES", 256)  # 0 disables caching
+MAX_BYTES = env_int("SIMPSONS_FIGURE_CACHE_BYTES", 32 * 1024 * 1024)
+
+
+class FigureCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> JSON string
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """Return the list of figures (as dicts) for key, calling build() to make them on a miss. build() must return a list of figures."""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if payload is None:
+            payload = to_json_plotly(list(build()))
+            self._put(key, payload)
+        return json.loads(payload)
+
+    def _put(self, key, payload):
+        size = len(payload)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._entries[key] = payload
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+figure_cache = FigureCache()
+metrics.register_stats("figure_cache", figure_cache.stats)
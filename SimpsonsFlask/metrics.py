@@ -0,0 +1,133 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+from SimpsonsData.settings import env_float
+from SimpsonsFlask import startup
+
+# In-process request metrics, exposed in the Prometheus text format on the /metrics route.
+# MetricsMiddleware times every request and starts a trace for it. The view code marks the end of each phase with lap(phase), which
+# records the time since the previous lap (or the start of the request); whatever follows the last lap (serialising the response in
+# Dash or Flask) is recorded as the "respond" phase. At the end of the request, the total and the phases go into histograms labelled
+# by view and specification, and requests slower than SLOW_SECONDS are logged with their phase breakdown.
+# Other modules can publish numeric stats (cache counters etc) with register_stats().
+SLOW_SECONDS = env_float("SIMPSONS_SLOW_REQUEST_SECONDS", 0)  # 0 turns off the slow-request log
+OTHER_SPECIFICATION = "other"  # label for requests whose specification id has not been found
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_trace = contextvars.ContextVar("simpsons_trace", default=None)
+_stats = {}  # name -> function returning a dict of numbers
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1  # i == len(buckets) is the +Inf bucket
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, label_values))
+            cumulative = 0
+            for le, count in zip([*map(str, self.buckets), "+Inf"], values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]}")
+        return lines
+
+
+request_seconds = Histogram("simpsons_request_seconds", "Request duration", ("view", "specification"))
+phase_seconds = Histogram("simpsons_phase_seconds", "Time spent in each phase of a request", ("view", "specification", "phase"))
+
+
+class Trace:
+    def __init__(self, view):
+        self.view = view
+        self.specification = ""
+        self.started = self.last = time.perf_counter()
+        self.phases = []  # (phase, seconds), in order
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+
+def lap(phase: str, specification_id=None, found=True):
+    """Record the time since the last lap as phase, for the current request (if any). Also sets the specification label.
+    The id comes from the URL, so pass found=False until the specification is known to exist: until then the request is labelled
+    OTHER_SPECIFICATION, so that made-up ids cannot add label values without limit."""
+    trace = _trace.get()
+    if trace is not None:
+        if specification_id is not None:
+            trace.specification = specification_id if found else OTHER_SPECIFICATION
+        trace.lap(phase)
+
+
+def register_stats(name: str, stats):
+    """Publish the numeric values of the dict returned by stats() as simpsons_{name}_{key}."""
+    _stats[name] = stats
+
+
+class MetricsMiddleware:
+    """WSGI middleware which traces each request. The view label is the part of the path after plaything_root, when it is a known
+    view or route, so that unknown paths cannot add label values without limit."""
+    def __init__(self, wsgi_app, plaything_root: str, known_views):
+        self.wsgi_app = wsgi_app
+        self.plaything_root = plaything_root
+        self.known_views = set(known_views)
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")[len(self.plaything_root):].strip("/")
+        view = path.split("/")[0] if path else "ROOT"
+        trace = Trace(view if view in self.known_views or view == "ROOT" else "other")
+        token = _trace.set(trace)
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            _trace.reset(token)
+            trace.lap("respond")
+            self.record(trace)
+
+    def record(self, trace):
+        total = trace.last - trace.started
+        request_seconds.observe((trace.view, trace.specification), total)
+        for phase, seconds in trace.phases:
+            phase_seconds.observe((trace.view, trace.specification, phase), seconds)
+        if 0 < SLOW_SECONDS <= total:
+            breakdown = ", ".join(f"{phase}={1000 * seconds:.1f}ms" for phase, seconds in trace.phases)
+            logging.warning(f"Slow request: {trace.view}/{trace.specification} took {1000 * total:.1f}ms ({breakdown})")
+
+
+def render() -> str:
+    lines = request_seconds.render() + phase_seconds.render()
+    lines += ["# HELP simpsons_startup_phase_seconds Duration of each start-up phase", "# TYPE simpsons_startup_phase_seconds gauge"]
+    lines += [f'simpsons_startup_phase_seconds{{phase="{_escape(p["phase"])}"}} {p["seconds"]}' for p in startup.report()["phases"]]
+    for name, stats in sorted(_stats.items()):
+        for key, value in stats().items():
+            if isinstance(value, (int, float)):
+                lines += [f"# TYPE simpsons_{name}_{key} untyped", f"simpsons_{name}_{key} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from simpsons import specification_items
+from SimpsonsData.settings import env_float, env_int
+
+# Cache of rendered pages which depend only on the set of specifications (and the query string), i.e. the index cards.
+# The specification set is re-read at most every REVALIDATE_SECONDS; when its fingerprint changes, all rendered pages are dropped
+# and the last-modified time moves on. Pages carry an ETag (a hash of the page) so that the route can answer conditional GETs.
+REVALIDATE_SECONDS = env_float("SIMPSONS_INDEX_REVALIDATE", 60)
+MAX_PAGES = env_int("SIMPSONS_INDEX_MAX_PAGES", 64)  # one per distinct query string
+
+
+def specifications_fingerprint(specifications):
+    content = json.dumps([[specification_id] + [getattr(spec, attr, None) for attr in ("title", "lang", "detail", "asset_map")]
+                          for specification_id, spec in specification_items(specifications)], sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class RenderedPage:
+    def __init__(self, html, last_modified):
+        self.html = html
+        self.etag = hashlib.sha1(html.encode("utf-8")).hexdigest()[:20]
+        self.last_modified = last_modified
+
+
+class PageCache:
+    def __init__(self, get_specifications, revalidate_seconds=REVALIDATE_SECONDS, max_pages=MAX_PAGES):
+        self.get_specifications = get_specifications
+        self.revalidate_seconds = revalidate_seconds
+        self.max_pages = max_pages
+        self._pages = OrderedDict()  # key -> RenderedPage
+        self._lock = threading.Lock()
+        self._specifications = None
+        self._fingerprint = None
+        self._checked = None
+        self.last_modified = None
+        self.hits = 0
+        self.misses = 0
+
+    def specifications(self):
+        """The current specification set, re-read from core when the last read is older than revalidate_seconds."""
+        with self._lock:
+            if self._checked is not None and time.monotonic() - self._checked < self.revalidate_seconds:
+                return self._specifications
+        specifications = self.get_specifications()
+        fingerprint = specifications_fingerprint(specifications)
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._pages.clear()
+                self._fingerprint = fingerprint
+                self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            self._specifications = specifications
+            self._checked = time.monotonic()
+        return specifications
+
+    def get(self, key, render) -> RenderedPage:
+        """The page for key, calling render(specifications) to make it when not cached."""
+        specifications = self.specifications()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+            last_modified = self.last_modified
+        page = RenderedPage(render(specifications), last_modified)
+        with self._lock:
+            if self.max_pages > 0 and last_modified == self.last_modified:  # not if the specifications changed meanwhile
+                self._pages[key] = page
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self):
+        with self._lock:
+            return {"pages": len(self._pages), "hits": self.hits, "misses": self.misses}
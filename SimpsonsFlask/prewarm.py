@@ -0,0 +1,46 @@
+import logging
+import time
+
+from simpsons import core, specification_items
+from SimpsonsFlask import startup
+from SimpsonsFlask.view_models import view_models
+
+
+def prewarm() -> dict:
+    """Load the data and build the view model for every enabled specification, and populate the in-process aggregate and figure
+    caches for the initial state of each view which uses it, so that the first visitor to a newly-started instance gets a cached response.
+    This runs in the process which imports it, so it only helps the HTTP function when both share a worker (as they do on
+    the Azure Functions Python worker). Returns a summary of what was warmed and how long it took."""
+    t0 = time.perf_counter()
+    views = {view_name: startup.import_view(view_name) for view_name in startup.VIEW_MODULES}
+    warmed = []
+    failed = {}
+    specifications = specification_items(core.get_specifications())
+    for specification_id, spec in specifications:
+        t_spec = time.perf_counter()
+        spec_views = []
+        try:
+            model = view_models.get(specification_id)
+        except Exception as ex:  # a broken specification should not stop the others being warmed
+            failed[specification_id] = repr(ex)
+            model = None
+        for view_name, dash_module in views.items() if model is not None else []:
+            try:
+                if dash_module.prewarm(model):
+                    spec_views.append(view_name)
+            except Exception as ex:
+                failed[f"{specification_id}/{view_name}"] = repr(ex)
+        warmed.append({"specification_id": specification_id, "views": spec_views, "seconds": round(time.perf_counter() - t_spec, 4)})
+
+    summary = {
+        "specifications": len(specifications),
+        "views_warmed": sum(len(w["views"]) for w in warmed),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - t0, 4),
+        "detail": warmed
+    }
+    logging.info(f"Pre-warmed {summary['views_warmed']} views for {summary['specifications']} specifications "
+                 f"in {summary['seconds']:.3f}s ({len(failed)} failed)")
+    for key, error in failed.items():
+        logging.warning(f"Pre-warm failed for {key}: {error}")
+    return summary
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from SimpsonsData.settings import env_flag
+
+# When set, the Dash views are imported and built on the first request to each view rather than when the Function host imports
+# the app, so that /ping, the index and /validate answer a cold start without paying for dash, plotly and pandas.
+LAZY_STARTUP = env_flag("SIMPSONS_LAZY_STARTUP")
+
+# module names in SimpsonsFlask.dash_apps, keyed by view_name (which is also the URL path component)
+VIEW_MODULES = {
+    "explore-categorical": "dash_explore_categorical",
+    "simulate-categorical": "dash_simulate_categorical",
+    "explore-continuous": "dash_explore_continuous"
+}
+
+_started = time.perf_counter()
+_phases = []  # dicts of phase, seconds and at (seconds since this module was imported, when the phase ended)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a named step of application start-up (including the first-hit build of lazily-registered views)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t1 = time.perf_counter()
+        _phases.append({"phase": name, "seconds": round(t1 - t0, 4), "at": round(t1 - _started, 4)})
+        logging.info(f"Startup phase '{name}' took {t1 - t0:.3f}s")
+
+
+def report() -> dict:
+    return {"lazy": LAZY_STARTUP, "phases": list(_phases)}
+
+
+def import_view(view_name: str):
+    with phase(f"import {view_name}"):
+        return import_module(f"SimpsonsFlask.dash_apps.{VIEW_MODULES[view_name]}")
+
+
+class LazyDashDispatcher:
+    """WSGI middleware which sends requests under <plaything_root>/<view_name>/ to a Flask app holding only that Dash view,
+    importing and building it on first use. Everything else goes to the main app.
+
+    Each view gets its own Flask app because Flask does not allow routes to be added to an app once it has handled a request.
+    make_app must return a Flask app prepared in the same way as the main one (same secret key, so the session is shared).
+    """
+    def __init__(self, main_wsgi_app, make_app, plaything_root: str):
+        self.main_wsgi_app = main_wsgi_app
+        self.make_app = make_app
+        self.prefixes = {f"{plaything_root}/{view_name}/": view_name for view_name in VIEW_MODULES}
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _view_app(self, view_name: str):
+        view_app = self._views.get(view_name)
+        if view_app is None:
+            with self._lock:
+                view_app = self._views.get(view_name)
+                if view_app is None:
+                    dash_module = import_view(view_name)
+                    with phase(f"build {view_name}"):
+                        view_app = self.make_app(dash_module).wsgi_app
+                    self._views[view_name] = view_app
+        return view_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        for prefix, view_name in self.prefixes.items():
+            if path.startswith(prefix):
+                return self._view_app(view_name)(environ, start_response)
+        return self.main_wsgi_app(environ, start_response)
@@ -0,0 +1,137 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from simpsons import core, Langstrings
+from SimpsonsData.datasets import load_data, spec_fingerprint
+from SimpsonsData.settings import env_float
+from SimpsonsData.simulate import starting_params
+from SimpsonsFlask import metrics
+
+# Registry of view models: everything the views need from a specification which does not depend on the user's selections (column
+# roles, labels, option lists, simulator starting parameters, language strings), worked out once per specification rather than
+# in every callback. A model is replaced when its specification or data asset changes; this is checked, for that specification
+# only, when it is looked up more than REVALIDATE_SECONDS after the last check.
+# Models are shared between requests and threads: the dicts and tuples they hold must not be modified.
+REVALIDATE_SECONDS = env_float("SIMPSONS_SPEC_REVALIDATE", 10)
+
+
+@dataclass(frozen=True)
+class ViewModel:
+    specification_id: str
+    spec: object
+    spec_version: str
+    data_version: str
+    langstrings: Langstrings
+    kind: str  # "categorical" or "continuous"
+    title: str
+    question: str
+    # categorical
+    outcome_col: Optional[str] = None
+    outcome_numerator: Optional[str] = None
+    outcome_rate_label: Optional[str] = None
+    input_count_label: Optional[str] = None
+    initial_variable: Optional[str] = None
+    category_orders: Optional[dict] = None
+    prop_categories: tuple = ()  # the columns which the user can choose to explore, in source order
+    facet_options: dict = field(default_factory=dict)  # compare column -> facet drop-down options
+    sim_cols: Optional[tuple] = None
+    sim_params: Optional[dict] = None  # SimpsonsData.simulate.starting_params()
+    sim_error: Optional[str] = None  # why the simulation view cannot be used (always set for continuous specifications)
+    # continuous
+    continuous_cols: Optional[tuple] = None
+    group_options: dict = field(default_factory=dict)
+    large_data_mode: str = "sample"
+
+
+def build_view_model(specification_id, spec, spec_version) -> ViewModel:
+    data, data_version = load_data(specification_id, spec)
+    langstrings = Langstrings(spec.lang)
+    detail = spec.detail
+    common = {"specification_id": specification_id, "spec": spec, "spec_version": spec_version, "data_version": data_version,
+              "langstrings": langstrings, "title": spec.title, "question": detail.get("question", "")}
+
+    if "continuous_cols" in detail:
+        continuous_cols = tuple(detail["continuous_cols"])
+        group_options = {k: k for k in set(data.columns).difference(continuous_cols)}  # the columns which the user can choose to group by.
+        group_options["none"] = langstrings.get("NONE")
+        # the simulation is only for categorical data
+        sim_error = ("Error: 'simulate_categories' missing from config" if "simulate_categories" not in detail
+                     else "Error: the simulation is not available for continuous data")
+        return ViewModel(kind="continuous", continuous_cols=continuous_cols, group_options=group_options,
+                         large_data_mode=detail.get("large_data_mode", "sample"), sim_error=sim_error, **common)
+
+    outcome_col = detail["outcome"]
+    prop_categories = tuple(c for c in data.columns if c not in ("N", outcome_col))
+    facet_options = {compare: {**{k: k for k in prop_categories if k != compare}, "none": langstrings.get("NONE")}
+                     for compare in prop_categories}
+
+    sim_cols = detail.get("simulate_categories", None)
+    sim_params = None
+    sim_error = None
+    if sim_cols is None:
+        sim_error = "Error: 'simulate_categories' missing from config"
+    else:
+        sim_cols = tuple(sim_cols)
+        try:
+            sim_params = starting_params(data, sim_cols, outcome_col, detail["outcome_numerator"])
+        except ValueError as ex:
+            sim_error = f"Error: {ex}"
+
+    return ViewModel(kind="categorical", outcome_col=outcome_col, outcome_numerator=detail["outcome_numerator"],
+                     outcome_rate_label=detail["outcome_rate_label"],
+                     input_count_label=detail.get("input_count_label", langstrings.get("COUNT")),
+                     initial_variable=detail.get("initial_variable", None), category_orders=detail.get("category_orders", None),
+                     prop_categories=prop_categories, facet_options=facet_options,
+                     sim_cols=sim_cols, sim_params=sim_params, sim_error=sim_error, **common)
+
+
+class ViewModelRegistry:
+    def __init__(self, revalidate_seconds=REVALIDATE_SECONDS):
+        self.revalidate_seconds = revalidate_seconds
+        self._models = {}  # specification_id -> [ViewModel, time checked]
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, specification_id: str) -> ViewModel:
+        with self._lock:
+            entry = self._models.get(specification_id)
+        if entry is not None and time.monotonic() - entry[1] < self.revalidate_seconds:
+            return entry[0]
+
+        spec = core.get_specification(specification_id)
+        spec_version = spec_fingerprint(spec)
+        if entry is not None and entry[0].spec_version == spec_version and load_data(specification_id, spec)[1] == entry[0].data_version:
+            entry[1] = time.monotonic()
+            return entry[0]
+
+        model = build_view_model(specification_id, spec, spec_version)
+        with self._lock:
+            self._models[specification_id] = [model, time.monotonic()]
+            self.builds += 1
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"models": len(self._models), "builds": self.builds}
+
+
+view_models = ViewModelRegistry()
+metrics.register_stats("view_models", view_models.stats)
+
+
+def parse_location(pathname: str, querystring: str):
+    """(specification_id, tag) from the dcc.Location of a view."""
+    specification_id = pathname.split('/')[-1]
+    tag = None
+    if len(querystring) > 0:
+        for param, value in [pv.split('=') for pv in querystring[1:].split("&")]:
+            if param == "tag":
+                tag = value
+                break
+    return specification_id, tag
@@ -1,6 +1,12 @@
 import azure.functions as func
 from pg_shared.azure_utils import timer_main
 from simpsons import PLAYTHING_NAME, core
+from SimpsonsData.settings import env_flag
+from SimpsonsFlask.prewarm import prewarm
+
+PREWARM = env_flag("SIMPSONS_PREWARM", True)
 
 def main(mytimer: func.TimerRequest) -> None:
     timer_main(mytimer, core, plaything_name=PLAYTHING_NAME)
+    if PREWARM:
+        prewarm()
@@ -0,0 +1,242 @@
+"""Time the Dash callbacks of the three views, end to end through the Flask test client, for generated specifications of increasing
+size, and check for regressions against a saved baseline.
+Run from the repository root: python -m benchmarks.bench_callbacks [--repeat N] [--save FILE] [--compare FILE]
+--save writes the results as JSON; --compare exits with status 1 if any case is slower, or uses more memory at peak, than in the
+baseline by more than the tolerances. Baselines are only comparable when made on the same machine and configuration.
+"""
+import os
+
+# the benchmark must not write activity to the real store, and times the server-side explore and simulate views
+os.environ["SIMPSONS_ACTIVITY_SINK"] = "memory"
+os.environ["SIMPSONS_CLIENTSIDE_EXPLORE"] = "false"
+os.environ["SIMPSONS_CLIENTSIDE_SIMULATE"] = "false"
+
+import argparse
+import gc
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import dash
+import numpy as np
+import pandas as pd
+import plotly
+
+from simpsons import core
+from SimpsonsData import cube, datasets, fits
+from SimpsonsData.resident import resident_set
+from SimpsonsData.simulate import starting_params
+from SimpsonsFlask import app
+from SimpsonsFlask.figure_cache import figure_cache
+from SimpsonsFlask.view_models import view_models
+
+
+class SyntheticSpecification:
+    """Stands in for a pg_shared specification, with the data generated rather than loaded."""
+    def __init__(self, specification_id, detail, data):
+        self.id = specification_id
+        self.title = specification_id
+        self.lang = "en"
+        self.detail = detail
+        self.asset_map = {"data": f"{specification_id}.csv"}
+        self.data = data
+
+    def load_asset_dataframe(self, asset_key):
+        return self.data.copy()
+
+    def make_menu(self, *args, **kwargs):
+        return []
+
+
+def categorical_spec(n_categories, n_columns, seed=0, missing=None):
+    """n_columns - 1 category columns with n_categories values each, a binary column (for the simulation), a binary outcome and N.
+    missing is an optional (Col0 value, Bin value) with no rows, so that the simulation cannot be used but the explore view can."""
+    rng = np.random.default_rng(seed)
+    columns = [f"Col{i}" for i in range(n_columns - 1)] + ["Bin"]
+    values = [[f"c{j}" for j in range(n_categories)] for _ in columns[:-1]] + [["b0", "b1"]]
+    data = pd.DataFrame(list(itertools.product(*values, ["yes", "no"])), columns=columns + ["Outcome"])
+    data["N"] = rng.integers(1, 1000, len(data))
+    specification_id = f"bench-cat-{n_categories}x{n_columns}"
+    if missing is not None:
+        data = data[(data.Col0 != missing[0]) | (data.Bin != missing[1])].reset_index(drop=True)
+        specification_id += "-missing"
+    detail = {"outcome": "Outcome", "outcome_numerator": "yes", "outcome_rate_label": "Rate", "initial_variable": "Bin",
+              "simulate_categories": ["Col0", "Bin"]}
+    return SyntheticSpecification(specification_id, detail, data)
+
+
+def continuous_spec(n_rows, n_groups, seed=0):
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, n_groups, n_rows)
+    x = rng.normal(group, 1.0)
+    data = pd.DataFrame({"X": x, "Y": 2 * x - 3 * group + rng.normal(0, 1.0, n_rows), "Group": [f"g{g}" for g in group]})
+    return SyntheticSpecification(f"bench-cont-{n_rows}x{n_groups}", {"continuous_cols": ["X", "Y"]}, data)
+
+
+def call_callback(client, view_name, outputs, inputs, changed, state=()):
+    """POST a callback request as the Dash renderer would; returns the decoded response."""
+    payload = {
+        "output": "..%s.." % "...".join(f"{i}.{p}" for i, p in outputs),
+        "outputs": [{"id": i, "property": p} for i, p in outputs],
+        "inputs": [{"id": i, "property": p, "value": v} for i, p, v in inputs],
+        "state": [{"id": i, "property": p, "value": v} for i, p, v in state],
+        "changedPropIds": changed
+    }
+    response = client.post(f"{core.plaything_root}/{view_name}/_dash-update-component", json=payload)
+    if response.status_code != 200:
+        raise RuntimeError(f"{view_name} callback failed with status {response.status_code}")
+    return response.get_json()
+
+
+def location(view_name, spec):
+    return [("location", "pathname", f"{core.plaything_root}/{view_name}/{spec.id}"), ("location", "search", "")]
+
+
+EXPLORE_CATEGORICAL_OUTPUTS = [("menu", "children"), ("heading", "children"), ("question", "children"), ("compare_label", "children"),
+                               ("compare_options", "options"), ("compare_options", "value"), ("facet_label", "children"),
+                               ("facet_options", "options"), ("facet_options", "value"), ("rates_chart", "figure"),
+                               ("counts_chart", "figure")]
+EXPLORE_CONTINUOUS_OUTPUTS = [("menu", "children"), ("heading", "children"), ("question", "children"), ("group_label", "children"),
+                              ("group_options", "options"), ("chart", "figure")]
+SIMULATE_OUTPUTS = [("rates_chart", "figure"), ("sim_error", "children")]
+SIMULATE_INPUTS_OUTPUTS = [("menu", "children"), ("heading", "children"), ("sim_params", "children"), ("sim_button", "children"),
+                           ("sim_options", "options"), ("sweep_label", "children"), ("sweep_x", "options"), ("sweep_x", "value"),
+                           ("sweep_y", "options"), ("sweep_button", "children")]
+
+
+def categorical_cases(client, spec):
+    view_name = "explore-categorical"
+    explore = lambda compare, facet, changed: lambda: call_callback(
+        client, view_name, EXPLORE_CATEGORICAL_OUTPUTS,
+        location(view_name, spec) + [("compare_options", "value", compare), ("facet_options", "value", facet)], [changed])
+    yield f"{view_name}/{spec.id}/initial", explore("Bin", "none", "location.pathname")
+    yield f"{view_name}/{spec.id}/compare", explore("Col0", "none", "compare_options.value")
+    yield f"{view_name}/{spec.id}/facet", explore("Col0", "Bin", "facet_options.value")
+
+    view_name = "simulate-categorical"
+    try:
+        params = starting_params(spec.data, spec.detail["simulate_categories"], "Outcome", "yes")
+    except ValueError as ex:
+        # the simulation cannot be used (the explore cases above must still work), and its view must say why
+        def simulate_error():
+            response = call_callback(client, view_name, SIMULATE_INPUTS_OUTPUTS, location(view_name, spec), ["location.pathname"])
+            if response["response"]["heading"]["children"] != f"Error: {ex}":
+                raise RuntimeError(f"{view_name} did not show the simulation error for {spec.id}")
+        yield f"{view_name}/{spec.id}/error", simulate_error
+        return
+    simulate = lambda options: lambda: call_callback(
+        client, view_name, SIMULATE_OUTPUTS,
+        location(view_name, spec) + [("sim_options", "value", options), ("sim_button", "n_clicks", 1)], ["sim_button.n_clicks"],
+        state=[("sim_state", "data", params)])
+    yield f"{view_name}/{spec.id}/simulate", simulate([])
+    yield f"{view_name}/{spec.id}/facet", simulate(["facet"])
+    yield f"{view_name}/{spec.id}/stochastic", simulate(["facet", "stochastic"])
+
+
+def continuous_cases(client, spec):
+    view_name = "explore-continuous"
+    explore = lambda group, changed: lambda: call_callback(
+        client, view_name, EXPLORE_CONTINUOUS_OUTPUTS, location(view_name, spec) + [("group_options", "value", group)], [changed])
+    yield f"{view_name}/{spec.id}/initial", explore("none", "location.pathname")
+    yield f"{view_name}/{spec.id}/group", explore("Group", "group_options.value")
+
+
+def clear_caches():
+    with datasets._lock:
+        datasets._loaded.clear()
+    with cube._lock:
+        cube._cubes.clear()
+    with fits._lock:
+        fits._sums.clear()
+    figure_cache.clear()
+    view_models.clear()
+    resident_set.clear()
+
+
+def measure(fn, repeat):
+    """Cold time (nothing cached), peak traced memory of a cold call, and best warm time (data cached but not the figures)."""
+    clear_caches()
+    t0 = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - t0
+
+    clear_caches()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    warm = []
+    for _ in range(repeat):
+        figure_cache.clear()
+        t0 = time.perf_counter()
+        fn()
+        warm.append(time.perf_counter() - t0)
+    return {"cold_ms": round(1000 * cold, 2), "ms": round(1000 * min(warm), 2), "peak_kb": round(peak / 1024)}
+
+
+def compare(results, baseline, tolerance, memory_tolerance, min_ms, min_kb):
+    """Cases which have regressed past the tolerances (fractional increases); differences below min_ms or min_kb are treated as noise."""
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if result["ms"] > base["ms"] * (1 + tolerance) and result["ms"] - base["ms"] > min_ms:
+            regressions.append(f"{case}: {result['ms']} ms, baseline {base['ms']} ms")
+        if result["peak_kb"] > base["peak_kb"] * (1 + memory_tolerance) and result["peak_kb"] - base["peak_kb"] > min_kb:
+            regressions.append(f"{case}: peak {result['peak_kb']} kB, baseline {base['peak_kb']} kB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results file to check against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed fractional increase in warm time")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="allowed fractional increase in peak memory")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="time differences smaller than this are ignored")
+    parser.add_argument("--min-kb", type=float, default=256, help="peak memory differences smaller than this are ignored")
+    args = parser.parse_args()
+
+    specs = [categorical_spec(n_categories, n_columns) for n_categories, n_columns in [(3, 3), (10, 3), (30, 3), (10, 5)]]
+    specs.append(categorical_spec(10, 3, missing=("c1", "b1")))
+    specs += [continuous_spec(n_rows, n_groups) for n_rows, n_groups in [(1000, 3), (10000, 5), (100000, 5), (300000, 10)]]
+    by_id = {spec.id: spec for spec in specs}
+    get_specification = core.get_specification
+    core.get_specification = lambda specification_id: by_id[specification_id] if specification_id in by_id else get_specification(specification_id)
+
+    client = app.test_client()
+    results = {}
+    print(f"{'case':<60} {'cold ms':>9} {'warm ms':>9} {'peak kB':>9}")
+    for spec in specs:
+        cases = categorical_cases(client, spec) if "continuous_cols" not in spec.detail else continuous_cases(client, spec)
+        for case, fn in cases:
+            results[case] = measure(fn, args.repeat)
+            print(f"{case:<60} {results[case]['cold_ms']:>9.1f} {results[case]['ms']:>9.1f} {results[case]['peak_kb']:>9}")
+    core.get_specification = get_specification
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                                       "plotly": plotly.__version__, "dash": dash.__version__, "machine": platform.machine()},
+                       "results": results}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance, args.min_ms, args.min_kb)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} ({len(set(results) & set(baseline))} cases compared)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Configuration for running the app on a Linux host with gunicorn (see requirements-server.txt), as an alternative to the Azure
+# Functions host:
+#   gunicorn -c gunicorn.conf.py
+# The app is loaded, and every specification pre-warmed (data assets loaded, view models built, initial figures drawn), in the master
+# process before the workers are forked, so the workers start with warm caches and share those pages copy-on-write.
+# kill -HUP <master pid> replaces the workers gracefully (they finish their requests first); new workers are forked from the master
+# and so have the same code and pre-warmed state, with later data or specification changes picked up by the usual revalidation.
+# To deploy new code, start a new master (kill -USR2, then -QUIT the old master once the new one is up) or restart the service.
+import gc
+import os
+
+from SimpsonsData.settings import env_flag, env_int
+
+wsgi_app = "SimpsonsFlask:app"
+bind = os.environ.get("SIMPSONS_SERVER_BIND", "0.0.0.0:8000")
+# the views are CPU-bound (pandas, plotly) so processes give the parallelism; threads cover waiting on I/O (assets, activity store)
+workers = env_int("SIMPSONS_SERVER_WORKERS", os.cpu_count() or 1)
+threads = env_int("SIMPSONS_SERVER_THREADS", 4)
+worker_class = "gthread"
+preload_app = True
+timeout = env_int("SIMPSONS_SERVER_TIMEOUT", 60)
+graceful_timeout = env_int("SIMPSONS_SERVER_GRACEFUL_TIMEOUT", 30)
+# replace each worker after about this many requests (0 = never), to bound the growth of its caches and heap
+max_requests = env_int("SIMPSONS_SERVER_MAX_REQUESTS", 0)
+max_requests_jitter = max_requests // 10
+accesslog = "-" if env_flag("SIMPSONS_SERVER_ACCESS_LOG") else None
+
+PREWARM = env_flag("SIMPSONS_PREWARM", True)
+
+
+def when_ready(server):
+    """Runs in the master, after the app has been loaded and before any worker is forked."""
+    if PREWARM:
+        from SimpsonsFlask.prewarm import prewarm
+        summary = prewarm()
+        server.log.info(f"Pre-warmed {summary['views_warmed']} views for {summary['specifications']} specifications "
+                        f"in {summary['seconds']:.3f}s ({len(summary['failed'])} failed)")
+    # objects which exist now are never collected in the workers, so the collector does not write to (and un-share) their pages
+    gc.freeze()
+    server.log.info(f"Forking {workers} workers of {threads} threads; {gc.get_freeze_count()} objects frozen")
+
+
+def worker_exit(server, worker):
+    """Write any queued activity records before a worker stops (e.g. on HUP or max_requests)."""
+    from SimpsonsFlask.activity import recorder
+    recorder.shutdown()
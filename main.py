@@ -1,5 +1,5 @@
-# Entry point for Pycharm etc... IDEs other than VSCode.
-from HelloWorldFlask import app
+# Entry point for Pycharm etc... IDEs other than VSCode. This is the Flask development server; see gunicorn.conf.py for multi-worker serving.
+from SimpsonsFlask import app
 
 if __name__ == "__main__":
     app.run()
@@ -33,6 +33,27 @@ class Langstrings(LangstringsBase):
         "SIMULATE": {
             "en": "Simulate"
         },
+        "SAMPLE_NOTE": {
+            "en": "Showing a sample of {shown:,} of {total:,} points"
+        },
+        "DENSITY_NOTE": {
+            "en": "Showing the density of {total:,} points"
+        },
+        "SWEEP": {
+            "en": "Sweep"
+        },
+        "SWEEP_LABEL": {
+            "en": "Where does the paradox appear as these vary?"
+        },
+        "PARADOX_REGION": {
+            "en": "Paradox region"
+        },
+        "MONTE_CARLO": {
+            "en": "Random variation"
+        },
+        "REVERSAL_NOTE": {
+            "en": "Paradox appears in {pc:.1f}% of {n:,} simulated populations (error bars show {level}% intervals)"
+        },
     }
 
 # The menu is only shown if menu=1 in query-string AND only for specific views. Generally make the menu contain all views it is coded for
@@ -48,4 +69,10 @@ menu = {
 }
 
 # This sets up core features such as logger, activity recording, core-config.
-core = Core(PLAYTHING_NAME)
\ No newline at end of file
+core = Core(PLAYTHING_NAME)
+
+def specification_items(specifications):
+    """(specification_id, specification) pairs from core.get_specifications(), which may be keyed by id or a plain list."""
+    if isinstance(specifications, dict):
+        return list(specifications.items())
+    return [(spec.id, spec) for spec in specifications]
\ No newline at end of file